@@ -1,10 +1,16 @@
 from fastapi import APIRouter
 from app.api.v1.endpoints import (
     auth,
+    bulk,
+    uploads,
+    usage,
     ws
 )
 
 api_router = APIRouter()
 
 api_router.include_router(auth.router, prefix="/auth", tags=["authentication"])
+api_router.include_router(bulk.router, prefix="/bulk", tags=["bulk"])
+api_router.include_router(uploads.router, prefix="/uploads", tags=["uploads"])
+api_router.include_router(usage.router, prefix="/usage", tags=["usage"])
 api_router.include_router(ws.router, prefix="/chatbot", tags=["chatbot"])
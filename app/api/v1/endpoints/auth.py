@@ -1,14 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+import math
+from fastapi import APIRouter, HTTPException, Depends, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from app.core.firebase_auth import GoogleAuthBackend
 from app.db.redis import SessionManager
+from app.services.rate_limiter import rate_limiter, RateLimitExceeded
 
 
 router = APIRouter()
 security = HTTPBearer()
 session_manager = SessionManager()
-auth_backend = GoogleAuthBackend.get_instance()
 
 
 class UserSession(BaseModel):
@@ -29,14 +30,17 @@ class LogoutResponse(BaseModel):
     message: str
 
 @router.post("/login", response_model=LoginResponse)
-async def login(login_request: LoginRequest):
+async def login(login_request: LoginRequest, request: Request):
     """Login with Firebase token and create session"""
     try:
+        # No uid is known before the token is verified, so logins are limited per client address
+        await rate_limiter.check("login", request.client.host if request.client else "unknown")
+
         # Check if session already exists
         user_data = await session_manager.get_session(login_request.firebase_token)
         if not user_data:
             # Verify Firebase token and create new session
-            user_data = auth_backend.verify_token(login_request.firebase_token)
+            user_data = GoogleAuthBackend.get_instance().verify_token(login_request.firebase_token)
             if not user_data:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -51,6 +55,12 @@ async def login(login_request: LoginRequest):
         )
     except HTTPException:
         raise
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=e.to_event(),
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -0,0 +1,79 @@
+import re
+
+from fastapi import APIRouter, HTTPException, Depends, Request, status
+from fastapi.responses import FileResponse, StreamingResponse
+
+from app.api.v1.deps import get_current_user
+from app.schemas.bulk import BulkJobStatus
+from app.services.bulk_jobs import bulk_job_manager
+
+
+router = APIRouter()
+
+
+async def _request_lines(request: Request):
+    """Split the streamed request body into lines without buffering the whole upload"""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8")
+    if buffer:
+        yield buffer.decode("utf-8")
+
+
+@router.post("/jobs", response_model=BulkJobStatus)
+async def create_bulk_job(request: Request, stream: bool = True, user: dict = Depends(get_current_user)):
+    """Upload product briefs as JSONL and generate ads for each.
+
+    With stream=true (default) results are streamed back as NDJSON while they
+    complete; the job keeps running if the client disconnects and can be
+    resumed with GET /jobs/{job_id}/results.
+    """
+    try:
+        job = await bulk_job_manager.create_job(user["uid"], _request_lines(request), plan=user.get("plan"))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if not stream:
+        return job
+    return StreamingResponse(
+        bulk_job_manager.stream_results(job.job_id),
+        media_type="application/x-ndjson",
+        headers={"X-Job-Id": job.job_id},
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=BulkJobStatus)
+async def get_bulk_job(job_id: str, user: dict = Depends(get_current_user)):
+    """Get progress of a bulk job"""
+    job = await bulk_job_manager.get_status(job_id, user["uid"])
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}/results")
+async def stream_bulk_job_results(job_id: str, offset: int = 0, user: dict = Depends(get_current_user)):
+    """Stream results from the given offset as NDJSON, following the job until it finishes"""
+    job = await bulk_job_manager.get_status(job_id, user["uid"])
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return StreamingResponse(
+        bulk_job_manager.stream_results(job_id, max(offset, 0)),
+        media_type="application/x-ndjson",
+        headers={"X-Job-Id": job_id},
+    )
+
+
+@router.get("/jobs/{job_id}/images/{image_ref}")
+async def get_bulk_job_image(job_id: str, image_ref: str, user: dict = Depends(get_current_user)):
+    """Download a generated image referenced by image_ref in the job's results"""
+    job = await bulk_job_manager.get_status(job_id, user["uid"])
+    if job is None or not re.fullmatch(r"[0-9a-f]{32}", job_id) or not re.fullmatch(r"\d+-\d+", image_ref):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    path = bulk_job_manager.image_path(job_id, image_ref)
+    if not path.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    return FileResponse(path, media_type="image/png")
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, HTTPException, Depends, Request, status
+
+from app.api.v1.deps import get_current_user
+from app.schemas.uploads import UploadedImage
+from app.services.upload_store import upload_store, InvalidImage, UploadTooLarge
+
+
+router = APIRouter()
+
+
+@router.post("/images", response_model=UploadedImage)
+async def upload_image(request: Request, user: dict = Depends(get_current_user)):
+    """Upload a product photo as the raw request body (chunked transfer encoding is fine).
+
+    The photo is downscaled for model input and can then be referenced by
+    upload_id in chat messages.
+    """
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("image/"):
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Send the image bytes with an image/* content type")
+    try:
+        return await upload_store.save(user["uid"], request.stream())
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except InvalidImage as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -0,0 +1,29 @@
+from datetime import date, datetime, timedelta, timezone
+
+from fastapi import APIRouter, HTTPException, Depends, status
+
+from app.api.v1.deps import get_current_user
+from app.services.metering import usage_meter
+
+
+router = APIRouter()
+
+
+@router.get("/me")
+async def get_my_usage(start: date = None, end: date = None, user: dict = Depends(get_current_user)):
+    """Tokens, images and wall time per day and model for the current user (last 7 days by default)"""
+    # Usage days are UTC
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=6)
+    if start > end or (end - start).days > 366:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid date range")
+    return {
+        "uid": user["uid"],
+        "usage": await usage_meter.get_usage(user["uid"], start, end),
+    }
+
+
+@router.get("/me/today")
+async def get_my_usage_today(user: dict = Depends(get_current_user)):
+    """Today's totals across models for the current user"""
+    return {"uid": user["uid"], "totals": await usage_meter.get_totals(user["uid"])}
@@ -1,39 +1,184 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import asyncio
 import json
+import time
+import uuid
 from datetime import datetime
+from typing import Optional
 
-from app.core.firebase_auth import GoogleAuthBackend
 from app.services.connection_manager import ConnectionManager
 from app.db.redis import session_manager
 from app.services.chatbot import ChatbotService
+from app.services.generation_manager import generation_manager, GenerationCancelled
 from app.prompts.prompts import Prompts
+from app.services.llm_scheduler import bind_scheduling
+from app.services.rate_limiter import rate_limiter, RateLimitExceeded
+from app.services.upload_store import upload_store
+from app.config import settings
+from app.core.logger import bind_context, get_logger
+
+logger = get_logger(__name__)
 
 router = APIRouter()
 security = HTTPBearer()
-auth_backend = GoogleAuthBackend.get_instance()
 
 # Global connection manager
 manager = ConnectionManager()
 
 chats = {}
 
+
+def generation_key(message_data: dict) -> Optional[str]:
+    """Identity of the generation a message asks for, or None for chat messages"""
+    if message_data.get("variant_id", False):
+        return f"final:{message_data['variant_id']}"
+    if message_data.get("template_id", False):
+        mode = "draft" if message_data.get("draft", settings.IMAGE_DRAFT_MODE) else "full"
+        return f"{mode}:{message_data['template_id']}"
+    return None
+
+
+def with_request_id(event: dict, request_id: Optional[str]) -> dict:
+    """Tag an outbound event with the request it answers; events may be shared, so copy"""
+    if request_id is None:
+        return event
+    return {**event, "request_id": request_id}
+
+
+async def run_generation(chatbot_service: ChatbotService, uid: str, key: str, message_data: dict, request_id: Optional[str]):
+    """Stream one generation to the user; identical in-flight requests share the work.
+
+    Requests without a request id keep the single-generation behaviour: a newer
+    one cancels the others.
+    """
+    supersede = request_id is None
+    if message_data.get("variant_id", False):
+        # Re-render the draft variant the user picked at full quality
+        variant_id = message_data["variant_id"]
+        async for response in generation_manager.stream(uid, key, lambda: chatbot_service.finalize_template(variant_id), supersede):
+            await manager.send_event(with_request_id(response, request_id), uid)
+        return
+
+    template_id = message_data["template_id"]
+    draft = key.startswith("draft:")
+    template = await chatbot_service.content_fetcher.fetch_template(template_id)
+    async for response in generation_manager.stream(uid, key, lambda: chatbot_service.generate_templates(template, draft=draft), supersede):
+        await manager.send_event(with_request_id(response, request_id), uid)
+
+    await manager.send_event(with_request_id(template, request_id), uid)
+
+
+async def run_chat(chatbot_service: ChatbotService, uid: str, message_data: dict, request_id: Optional[str], chat_lock: asyncio.Lock):
+    # Photos are referenced by the ids returned from the upload endpoint, never sent inline
+    upload_ids = [str(upload_id) for upload_id in message_data.get("upload_ids") or []]
+
+    # Chat turns share the conversation history, so they run one at a time in arrival order.
+    # The lock is taken before any other await so a turn cannot be overtaken while its uploads are checked
+    async with chat_lock:
+        for upload_id in upload_ids:
+            if not await upload_store.owns(uid, upload_id):
+                raise Exception(f"Unknown upload id: {upload_id}")
+        async for response in chatbot_service.process_user_message(message_data.get("message"), upload_ids):
+            await manager.send_event(with_request_id(response, request_id), uid)
+
+
+async def handle_request(request, uid: str, request_id: Optional[str]):
+    """Run one dispatched request, reporting its failure to the client"""
+    try:
+        await request
+    except GenerationCancelled:
+        logger.info("Generation cancelled", extra={"request_id": request_id})
+    except Exception as e:
+        error_message = {
+            "type": "error",
+            "message": f"An error occurred: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+        await manager.send_event(with_request_id(error_message, request_id), uid)
+
+
+# Per uid: marker of the latest disconnect, and requests left running by dropped sockets
+last_disconnects: dict[str, object] = {}
+abandoned_tasks: dict[str, list[asyncio.Task]] = {}
+
+
+def schedule_release(uid: str, pending: list[asyncio.Task]):
+    """Release uid's state after the grace period; a later disconnect restarts the period"""
+    marker = object()
+    last_disconnects[uid] = marker
+    abandoned_tasks[uid] = [task for task in abandoned_tasks.get(uid, []) if not task.done()] + pending
+    asyncio.get_running_loop().call_later(settings.GENERATION_DISCONNECT_GRACE, release_if_gone, uid, marker)
+
+
+def release_if_gone(uid: str, marker: object):
+    """Cancel requests left by dropped sockets and free the conversation unless the user has reconnected"""
+    if last_disconnects.get(uid) is not marker:
+        # Superseded by a later disconnect, whose own timer decides
+        return
+    if uid in manager.active_connections:
+        return
+    del last_disconnects[uid]
+    for task in abandoned_tasks.pop(uid, []):
+        task.cancel()
+    chatbot_service = chats.pop(uid, None)
+    if chatbot_service is not None:
+        chatbot_service.cancel_pending()
+        logger.info("Released conversation state", extra={"uid": uid})
+
+
+def connection_memory(uid: str) -> int:
+    """Approximate bytes held for uid: conversation history, cached uploads, drafts and buffered events"""
+    chatbot_service = chats.get(uid)
+    held = sum(chatbot_service.memory_usage().values()) if chatbot_service is not None else 0
+    return held + generation_manager.memory_usage(uid)
+
+
+_stats_cache: dict = {}
+
+
+def connection_stats() -> dict:
+    """Per-connection traffic and memory, plus conversations kept for reconnects.
+
+    Measuring walks every conversation, so the result is reused for WS_STATS_INTERVAL.
+    """
+    now = time.monotonic()
+    if _stats_cache and now - _stats_cache["measured_at"] < settings.WS_STATS_INTERVAL:
+        return _stats_cache["stats"]
+    stats = manager.stats({uid: connection_memory(uid) for uid in manager.connection_stats})
+    retained = [uid for uid in chats if uid not in manager.active_connections]
+    stats["retained_conversations"] = len(retained)
+    stats["retained_memory_bytes"] = sum(connection_memory(uid) for uid in retained)
+    stats["measured_at"] = datetime.now().isoformat()
+    _stats_cache.update(stats=stats, measured_at=now)
+    return stats
+
 # Removed authentication validations - direct UID-based connection
 
 @router.websocket("/ws/{uid}")
-async def websocket_endpoint(websocket: WebSocket, uid: str):
-    """WebSocket endpoint for chatbot communication using UID"""
+async def websocket_endpoint(websocket: WebSocket, uid: str, last_event_id: Optional[str] = None):
+    """WebSocket endpoint for chatbot communication using UID.
+
+    Reconnecting clients pass the last event id they received ("0" for
+    everything logged) to get the events they missed replayed.
+    """
+    bind_context(uid=uid, connection_id=uuid.uuid4().hex[:12])
+    # Every request runs as its own task so chat stays responsive while generations run
+    request_tasks: dict[str, asyncio.Task] = {}
+    generation_keys: dict[str, str] = {}
+    chat_lock = asyncio.Lock()
     try:
-        print(f"WebSocket connection for UID: {uid}")
+        logger.info("WebSocket connection")
         
         # Try to get user data from session, otherwise create simple user data
-        user_data = await session_manager.get_session(uid)
+        user_data = await session_manager.get_data_by_uid(uid)
         if not user_data:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid or expired session. Please log in again."
             )
-        print(f"No session found for UID {uid}, using default user data")
+
+        bind_scheduling(plan=user_data.get("plan"))
 
         if uid not in chats:
             chats[uid] = ChatbotService(Prompts.INFORMATION_COLLECTION_PROMPT.value)
@@ -50,53 +195,106 @@ async def websocket_endpoint(websocket: WebSocket, uid: str):
             "timestamp": datetime.now().isoformat()
         }
         await manager.send_personal_message(json.dumps(welcome_message), uid)
+        if last_event_id is not None:
+            await manager.replay(uid, last_event_id)
         
         # Listen for messages
         while True:
+            request_id = None
             try:
-                # Receive message from client
-                data = await websocket.receive_text()
-                message_data = json.loads(data)
-
-                if message_data.get("template_id", False):
-                    template_id = message_data["template_id"]
-                    # Fetch and send the template
-                    template = await chatbot_service.content_fetcher.fetch_template(template_id)
-                    async for response in chatbot_service.generate_templates(template):
-                        await manager.send_personal_message(json.dumps(response), uid)
-                    
-                    await manager.send_personal_message(json.dumps(template), uid)
+                # Receive message from client, waking up to heartbeat while it is quiet
+                try:
+                    data = await asyncio.wait_for(websocket.receive_text(), timeout=min(settings.WS_HEARTBEAT_INTERVAL, manager.lifetime_left(uid)))
+                except asyncio.TimeoutError:
+                    data = None
+                else:
+                    bind_context(trace_id=uuid.uuid4().hex[:16])
+                    logger.debug("Message received", extra={"size": len(data), "sample_rate": settings.LOG_SAMPLE_RATE})
+                    message_data = json.loads(data)
+                    keepalive = message_data.get("type") in ("ping", "pong")
+                    manager.record_inbound(uid, len(data), activity=not keepalive)
+
+                # Reap and check expiry after every wake-up, so clients that never go quiet
+                # (or only send keepalives) are closed on time as well
+                for finished in [rid for rid, task in request_tasks.items() if task.done()]:
+                    del request_tasks[finished]
+                    generation_keys.pop(finished, None)
+                reason = manager.expired(uid, busy=bool(request_tasks))
+                if reason:
+                    logger.info("Closing WebSocket", extra={"reason": reason})
+                    await websocket.close(code=1001, reason=f"Connection {reason} timeout")
+                    break
+                if data is None:
+                    await manager.heartbeat(uid)
+                    continue
+
+                if message_data.get("type") == "pong":
+                    continue
+                if message_data.get("type") == "ping":
+                    await manager.send_personal_message(json.dumps({"type": "pong", "timestamp": datetime.now().isoformat()}), uid)
+                    continue
+                request_id = message_data.get("request_id")
+                if request_id is not None:
+                    request_id = str(request_id)
+
+                key = generation_key(message_data)
+                if key and request_id is None and key in generation_keys.values():
+                    # Double-sent request: the running generation already answers it
+                    continue
+                if len(request_tasks) >= settings.WS_MAX_CONCURRENT_REQUESTS:
+                    error_message = {
+                        "type": "error",
+                        "code": "too_many_requests",
+                        "message": "Too many requests in progress. Please wait for one to finish.",
+                        "timestamp": datetime.now().isoformat()
+                    }
+                    await manager.send_event(with_request_id(error_message, request_id), uid)
+                    continue
+
+                bucket = "generation" if key else "chat"
+                await rate_limiter.check(bucket, uid)
+
+                task_id = request_id if request_id is not None and request_id not in request_tasks else uuid.uuid4().hex
+                if key:
+                    request = run_generation(chatbot_service, uid, key, message_data, request_id)
+                    generation_keys[task_id] = key
                 else:
-                    # Process the message
-                    async for response in chatbot_service.process_user_message(message_data.get("message")):
-                        # Send response back to client
-                        await manager.send_personal_message(json.dumps(response), uid)
+                    request = run_chat(chatbot_service, uid, message_data, request_id, chat_lock)
+                request_tasks[task_id] = asyncio.create_task(handle_request(request, uid, request_id))
                 
             except WebSocketDisconnect:
                 break
+            except RateLimitExceeded as e:
+                error_message = e.to_event()
+                error_message["timestamp"] = datetime.now().isoformat()
+                await manager.send_event(with_request_id(error_message, request_id), uid)
             except json.JSONDecodeError:
                 error_message = {
                     "type": "error",
                     "message": "Invalid message format. Please send valid JSON.",
                     "timestamp": datetime.now().isoformat()
                 }
-                await manager.send_personal_message(json.dumps(error_message), uid)
+                await manager.send_event(error_message, uid)
             except Exception as e:
                 error_message = {
                     "type": "error",
                     "message": f"An error occurred: {str(e)}",
                     "timestamp": datetime.now().isoformat()
                 }
-                await manager.send_personal_message(json.dumps(error_message), uid)
+                await manager.send_event(error_message, uid)
                 
     except Exception as e:
         # Handle any errors
-        print(f"WebSocket error for UID {uid}: {str(e)}")
+        logger.error("WebSocket error", extra={"error": str(e)})
         try:
             await websocket.close(code=1011, reason=f"Server error: {str(e)}")
         except:
             pass
     finally:
-        # Cleanup
-        manager.disconnect(uid)
-        print(f"Cleaned up connection for UID: {uid}")
+        # Cleanup: in-flight requests keep logging and the conversation is kept for a grace
+        # period so a reconnect can replay and continue; after that both are released
+        schedule_release(uid, [task for task in request_tasks.values() if not task.done()])
+        if uid in chats:
+            chats[uid].cancel_pending()
+        manager.disconnect(uid, websocket)
+        logger.info("Cleaned up connection")
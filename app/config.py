@@ -1,5 +1,7 @@
 from pydantic import BaseModel
+from typing import Optional
 import os
+import socket
 from dotenv import load_dotenv
 
 load_dotenv()  # load environment variables from .env file
@@ -9,11 +11,53 @@ class Settings(BaseModel):
     MONGODB_URL: str = os.getenv("MONGODB_URL", "mongodb://localhost:27017/")
     DATABASE_NAME: str = os.getenv("DATABASE_NAME", "advertisements_db")
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    REDIS_MODE: str = os.getenv("REDIS_MODE", "standalone")  # "standalone", "sentinel" or "cluster"
+    REDIS_SENTINELS: str = os.getenv("REDIS_SENTINELS", "")  # "host:port,host:port"
+    REDIS_SENTINEL_MASTER: str = os.getenv("REDIS_SENTINEL_MASTER", "mymaster")
+    REDIS_SENTINEL_PASSWORD: Optional[str] = os.getenv("REDIS_SENTINEL_PASSWORD")
+    REDIS_PASSWORD: Optional[str] = os.getenv("REDIS_PASSWORD")
+    REDIS_DB: int = int(os.getenv("REDIS_DB", 0))
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", 64))
+    REDIS_SOCKET_TIMEOUT: float = float(os.getenv("REDIS_SOCKET_TIMEOUT", 5))
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT", 2))
+    REDIS_HEALTH_CHECK_INTERVAL: int = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
+    REDIS_KEY_PREFIX: str = os.getenv("REDIS_KEY_PREFIX", "mag:v1")  # Bump the version to move to a new key layout
         
     # Application
     DEBUG: bool = os.getenv("DEBUG", "True") == "True"
     HOST: str = os.getenv("HOST", "0.0.0.0")
     PORT: int = int(os.getenv("PORT", 8000))
+    # Proxies whose X-Forwarded-For is trusted for the client address (per-client login limits);
+    # set to the load balancer's addresses, or "*" when the app is only reachable through it
+    FORWARDED_ALLOW_IPS: str = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+    # Event loop blocking detector (opt-in, cheap enough for canaries)
+    LOOP_MONITOR_ENABLED: bool = os.getenv("LOOP_MONITOR_ENABLED", "False") == "True"
+    LOOP_MONITOR_INTERVAL_MS: float = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", 50))
+    LOOP_MONITOR_THRESHOLD_MS: float = float(os.getenv("LOOP_MONITOR_THRESHOLD_MS", 100))
+    LOOP_MONITOR_MAX_REPORTS_PER_MINUTE: int = int(os.getenv("LOOP_MONITOR_MAX_REPORTS_PER_MINUTE", 6))
+
+    # Production launcher (serve.py)
+    WORKERS: int = int(os.getenv("WORKERS", os.cpu_count() or 1))
+    REUSE_PORT: bool = os.getenv("REUSE_PORT", "False") == "True"
+    WORKER_MAX_MEMORY_MB: int = int(os.getenv("WORKER_MAX_MEMORY_MB", 0))  # 0 disables recycling
+    WORKER_MEMORY_CHECK_INTERVAL: float = float(os.getenv("WORKER_MEMORY_CHECK_INTERVAL", 5))
+    GRACEFUL_SHUTDOWN_TIMEOUT: int = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", 30))
+
+    # Logging
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_LEVELS: str = os.getenv("LOG_LEVELS", "")  # Per-module overrides, e.g. "app.db=WARNING,app.services.chatbot=DEBUG"
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")  # "json" or "text"
+    LOG_SAMPLE_RATE: float = float(os.getenv("LOG_SAMPLE_RATE", 0.01))  # Fraction of high-frequency events kept
+
+    # Health monitoring
+    HEALTH_CHECK_INTERVAL: float = float(os.getenv("HEALTH_CHECK_INTERVAL", 10))
+    HEALTH_CHECK_TIMEOUT: float = float(os.getenv("HEALTH_CHECK_TIMEOUT", 2))
+    HEALTH_FAILURE_THRESHOLD: int = int(os.getenv("HEALTH_FAILURE_THRESHOLD", 3))
+    HEALTH_RECOVERY_THRESHOLD: int = int(os.getenv("HEALTH_RECOVERY_THRESHOLD", 2))
+    HEALTH_WINDOW: int = int(os.getenv("HEALTH_WINDOW", 30))
+    # Off by default: the probe is a paid, rate-limited provider call made by every worker each interval
+    HEALTH_CHECK_LLM: bool = os.getenv("HEALTH_CHECK_LLM", "False") == "True"
     
     # Firebase Client Configuration
     FIREBASE_API_KEY: str = os.getenv("FIREBASE_API_KEY")
@@ -22,8 +66,92 @@ class Settings(BaseModel):
     FIREBASE_STORAGE_BUCKET: str = os.getenv("FIREBASE_STORAGE_BUCKET")
     FIREBASE_MESSAGING_SENDER_ID: str = os.getenv("FIREBASE_MESSAGING_SENDER_ID")
     FIREBASE_APP_ID: str = os.getenv("FIREBASE_APP_ID")
+    # Service account used by firebase_admin to verify ID tokens
+    FIREBASE_SA_FILE: Optional[str] = os.getenv("FIREBASE_SA_FILE")
 
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY")
+
+    # Generation
+    SPECULATIVE_DESCRIPTIONS_BUDGET: int = int(os.getenv("SPECULATIVE_DESCRIPTIONS_BUDGET", 3))
+    IMAGE_PREVIEW_PARTIALS: int = int(os.getenv("IMAGE_PREVIEW_PARTIALS", 2))  # 0-3 provider previews per image
+    IMAGE_PREVIEW_MIN_INTERVAL: float = float(os.getenv("IMAGE_PREVIEW_MIN_INTERVAL", 1.0))  # Seconds between previews per variant
+    CAPTION_BATCH_ENABLED: bool = os.getenv("CAPTION_BATCH_ENABLED", "True") == "True"
+    # Outbound WebSocket events kept per uid for reconnect replay
+    EVENT_LOG_ENABLED: bool = os.getenv("EVENT_LOG_ENABLED", "True") == "True"
+    EVENT_LOG_MAX_LEN: int = int(os.getenv("EVENT_LOG_MAX_LEN", 100))
+    EVENT_LOG_TTL: int = int(os.getenv("EVENT_LOG_TTL", 3600))
+    GENERATION_DISCONNECT_GRACE: float = float(os.getenv("GENERATION_DISCONNECT_GRACE", 120))  # Seconds generations outlive a dropped socket
+    WS_MAX_CONCURRENT_REQUESTS: int = int(os.getenv("WS_MAX_CONCURRENT_REQUESTS", 4))  # In-flight requests per WebSocket connection
+    # WebSocket liveness: protocol pings by the server plus application heartbeats and lifetimes
+    WS_PING_INTERVAL: float = float(os.getenv("WS_PING_INTERVAL", 20))  # Protocol ping frames; unanswered pings drop half-open peers
+    WS_PING_TIMEOUT: float = float(os.getenv("WS_PING_TIMEOUT", 20))
+    WS_HEARTBEAT_INTERVAL: float = float(os.getenv("WS_HEARTBEAT_INTERVAL", 25))  # {"type": "ping"} events while the client is quiet
+    WS_IDLE_TIMEOUT: float = float(os.getenv("WS_IDLE_TIMEOUT", 900))  # No client messages besides keepalives and no requests in flight
+    WS_STATS_INTERVAL: float = float(os.getenv("WS_STATS_INTERVAL", 30))  # Reuse per-connection memory measurements in /health
+    WS_MAX_LIFETIME: float = float(os.getenv("WS_MAX_LIFETIME", 4 * 3600))  # Clients reconnect (and replay) after this
+    # Draft mode renders cheap variants first and only the chosen one at full quality
+    IMAGE_DRAFT_MODE: bool = os.getenv("IMAGE_DRAFT_MODE", "False") == "True"  # Default when the client does not say
+    IMAGE_DRAFT_MODEL: str = os.getenv("IMAGE_DRAFT_MODEL", "gpt-5-mini")  # Name in LLMConfig
+    IMAGE_DRAFT_QUALITY: str = os.getenv("IMAGE_DRAFT_QUALITY", "low")
+    IMAGE_DRAFT_SIZE: Optional[str] = os.getenv("IMAGE_DRAFT_SIZE")  # Provider default when unset
+    IMAGE_DRAFT_MAX_VARIANTS: int = int(os.getenv("IMAGE_DRAFT_MAX_VARIANTS", 64))  # Per chat session, least recently used dropped first
+
+    # Hashtag index built from generated posts
+    HASHTAG_INDEX_ENABLED: bool = os.getenv("HASHTAG_INDEX_ENABLED", "True") == "True"
+    HASHTAG_INDEX_MAX_TAGS: int = int(os.getenv("HASHTAG_INDEX_MAX_TAGS", 1024))
+    HASHTAG_INDEX_REFRESH_SECONDS: float = float(os.getenv("HASHTAG_INDEX_REFRESH_SECONDS", 300))
+    HASHTAG_CAPTION_ONLY: bool = os.getenv("HASHTAG_CAPTION_ONLY", "False") == "True"  # Ask the model for captions only once the index is ready
+    HASHTAG_CAPTION_ONLY_MIN_TAGS: int = int(os.getenv("HASHTAG_CAPTION_ONLY_MIN_TAGS", 200))
+
+    # Product photo uploads, downscaled for model input
+    IMAGE_UPLOAD_DIR: str = os.getenv("IMAGE_UPLOAD_DIR", "images/uploads")
+    IMAGE_UPLOAD_MAX_BYTES: int = int(os.getenv("IMAGE_UPLOAD_MAX_BYTES", 25 * 1024 * 1024))
+    IMAGE_UPLOAD_MAX_SIDE: int = int(os.getenv("IMAGE_UPLOAD_MAX_SIDE", 1024))  # Longest side in pixels after downscaling
+    IMAGE_UPLOAD_QUALITY: int = int(os.getenv("IMAGE_UPLOAD_QUALITY", 85))  # JPEG quality of the processed image
+    IMAGE_UPLOAD_WORKERS: int = int(os.getenv("IMAGE_UPLOAD_WORKERS", 2))
+
+    # Fair scheduling of LLM calls across users and job classes (per worker process)
+    LLM_SCHEDULER_ENABLED: bool = os.getenv("LLM_SCHEDULER_ENABLED", "True") == "True"
+    LLM_SCHEDULER_CONCURRENCY: int = int(os.getenv("LLM_SCHEDULER_CONCURRENCY", 16))  # Concurrent provider calls
+    LLM_SCHEDULER_CLASS_WEIGHTS: str = os.getenv("LLM_SCHEDULER_CLASS_WEIGHTS", "interactive:8,structured:4,image:2,bulk:1")
+    LLM_SCHEDULER_PLAN_WEIGHTS: str = os.getenv("LLM_SCHEDULER_PLAN_WEIGHTS", "free:1,pro:3")
+    LLM_SCHEDULER_DEFAULT_PLAN: str = os.getenv("LLM_SCHEDULER_DEFAULT_PLAN", "free")
+    LLM_SCHEDULER_MAX_WAIT: float = float(os.getenv("LLM_SCHEDULER_MAX_WAIT", 30))  # Seconds before a queued call may be admitted regardless of weight
+    LLM_SCHEDULER_STARVATION_INTERVAL: int = int(os.getenv("LLM_SCHEDULER_STARVATION_INTERVAL", 4))  # At most one such call per this many admissions
+    LLM_SCHEDULER_SLOW_WAIT: float = float(os.getenv("LLM_SCHEDULER_SLOW_WAIT", 2))  # Queue waits at least this long are logged
+
+    # Bulk generation
+    BULK_CONCURRENCY: int = int(os.getenv("BULK_CONCURRENCY", 4))
+    BULK_MAX_ITEMS: int = int(os.getenv("BULK_MAX_ITEMS", 2000))
+    BULK_JOB_TTL: int = int(os.getenv("BULK_JOB_TTL", 86400))
+    BULK_POLL_INTERVAL: float = float(os.getenv("BULK_POLL_INTERVAL", 0.5))
+    BULK_IMAGE_DIR: str = os.getenv("BULK_IMAGE_DIR", "images/bulk")  # Shared volume when several hosts serve results
+
+    # Usage metering
+    USAGE_FLUSH_INTERVAL_MS: int = int(os.getenv("USAGE_FLUSH_INTERVAL_MS", 1000))
+    USAGE_REDIS_TTL_DAYS: int = int(os.getenv("USAGE_REDIS_TTL_DAYS", 35))
+
+    # Rate limiting, as "<capacity>/<seconds>" token buckets
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "True") == "True"
+    RATE_LIMIT_CHAT: str = os.getenv("RATE_LIMIT_CHAT", "20/60")
+    RATE_LIMIT_GENERATION: str = os.getenv("RATE_LIMIT_GENERATION", "5/600")
+    RATE_LIMIT_LOGIN: str = os.getenv("RATE_LIMIT_LOGIN", "10/60")
+    RATE_LIMIT_LOCAL_TTL: float = float(os.getenv("RATE_LIMIT_LOCAL_TTL", 30.0))  # Local spend stays within the headroom however long this is
+    RATE_LIMIT_LOCAL_HEADROOM: float = float(os.getenv("RATE_LIMIT_LOCAL_HEADROOM", 0.5))
+
+    # Image cache
+    IMAGE_CACHE_ENABLED: bool = os.getenv("IMAGE_CACHE_ENABLED", "True") == "True"
+    IMAGE_CACHE_DIR: str = os.getenv("IMAGE_CACHE_DIR", "images/cache")
+    IMAGE_CACHE_MAX_BYTES: int = int(os.getenv("IMAGE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+    # Hosts with the same scope share one LRU index and byte budget, so only give pods that
+    # mount the same IMAGE_CACHE_DIR volume a common scope; by default each host has its own
+    IMAGE_CACHE_SCOPE: str = os.getenv("IMAGE_CACHE_SCOPE", socket.gethostname())
+
+    # Template suggestions
+    TEMPLATE_SUGGESTIONS: int = int(os.getenv("TEMPLATE_SUGGESTIONS", 5))
+    TEMPLATE_INDEX_FEATURES: int = int(os.getenv("TEMPLATE_INDEX_FEATURES", 1024))
+    TEMPLATE_INDEX_REFRESH_SECONDS: float = float(os.getenv("TEMPLATE_INDEX_REFRESH_SECONDS", 300))
+    TEMPLATE_INDEX_PATH: Optional[str] = os.getenv("TEMPLATE_INDEX_PATH")
     
     @property
     def firebase_config(self) -> dict:
@@ -36,7 +164,5 @@ class Settings(BaseModel):
             "messagingSenderId": self.FIREBASE_MESSAGING_SENDER_ID,
             "appId": self.FIREBASE_APP_ID
         }
-    
-    FIREBASE_SA_FILE: str = os.getenv("FIREBASE_SA_FILE")
 
 settings = Settings()
@@ -1,6 +1,5 @@
 from enum import IntEnum
-import firebase_admin
-from firebase_admin import credentials, auth
+import threading
 from app.config import settings
 
 class AuthType(IntEnum):
@@ -14,9 +13,17 @@ class AuthFailedException(Exception):
 
 class GoogleAuthBackend:
     _instance = None
+    _lock = threading.Lock()
 
     def __init__(self, config):
+        # firebase_admin is imported here so it only loads on first use
+        import firebase_admin
+        from firebase_admin import credentials, auth
+
         self.type = AuthType.GOOGLE
+        self._auth = auth
+        if not config.get('SA_KEY_FILE'):
+            raise AuthInitException("FIREBASE_SA_FILE is not configured")
         self.cred = credentials.Certificate(config['SA_KEY_FILE'])
         try:
             firebase_admin.initialize_app(credential=self.cred)
@@ -29,12 +36,14 @@ class GoogleAuthBackend:
     @classmethod
     def get_instance(cls):
         if cls._instance is None:
-            cls._instance = GoogleAuthBackend({"SA_KEY_FILE": settings.FIREBASE_SA_FILE})
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = GoogleAuthBackend({"SA_KEY_FILE": settings.FIREBASE_SA_FILE})
         return cls._instance
 
     def verify_token(self, token):
         try:
-            decoded = auth.verify_id_token(token)
+            decoded = self._auth.verify_id_token(token)
             if not decoded.get('email_verified'):
                 raise AuthFailedException("Email not verified")
         except Exception as e:
@@ -45,4 +54,6 @@ class GoogleAuthBackend:
             'name': decoded.get('name', 'Anonymous'),
             'email': decoded.get('email'),
             'uid': decoded.get('uid'),
+            # Custom claim set through the Admin SDK; None means the default plan
+            'plan': decoded.get('plan'),
         }
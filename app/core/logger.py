@@ -0,0 +1,150 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.config import settings
+
+
+# Request-scoped context attached to every record logged from the current task
+_uid = contextvars.ContextVar("uid", default=None)
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+_connection_id = contextvars.ContextVar("connection_id", default=None)
+
+_CONTEXT_VARS = {"uid": _uid, "trace_id": _trace_id, "connection_id": _connection_id}
+
+# Attributes every LogRecord has; anything else came from `extra=` and is emitted as a field
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName", "sample_rate"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def bind_context(**values):
+    """Bind uid, trace_id and/or connection_id to logs from the current task"""
+    for key, value in values.items():
+        _CONTEXT_VARS[key].set(value)
+
+
+def get_context(key: str):
+    """Read a bound context value (uid, trace_id or connection_id) for the current task"""
+    return _CONTEXT_VARS[key].get()
+
+
+class ContextFilter(logging.Filter):
+    """Copy context variables onto the record before it leaves the event loop thread"""
+
+    def filter(self, record):
+        for key, var in _CONTEXT_VARS.items():
+            if not hasattr(record, key):
+                setattr(record, key, var.get())
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of high-frequency records: logger.info(..., extra={"sample_rate": 0.01})"""
+
+    def filter(self, record):
+        rate = getattr(record, "sample_rate", None)
+        return rate is None or random.random() < rate
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Formatted by StructuredQueueHandler.prepare before the record was queued
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that keeps the traceback in exc_text instead of merging it into the message.
+
+    The default prepare() formats the whole record, traceback included, into
+    msg and drops exc_info, which would leave the formatters nothing to emit as
+    a separate field.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Formatted on the calling thread like the default, but kept out of msg
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_exception_formatter = logging.Formatter()
+
+
+def _parse_levels(spec: str) -> dict:
+    """Parse "app.db=WARNING,app.services.chatbot=DEBUG" into a mapping"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging():
+    """Route app logs through a queue to a listener thread that writes JSON lines.
+
+    Callers on the event loop only enqueue records; formatting and the blocking
+    stdout write happen off-loop.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+    queue_handler.addFilter(ContextFilter())
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT == "json":
+        stream_handler.setFormatter(JSONFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    app_logger = logging.getLogger("app")
+    app_logger.handlers = [queue_handler]
+    app_logger.setLevel(settings.LOG_LEVEL.upper())
+    app_logger.propagate = False
+    for name, level in _parse_levels(settings.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
@@ -0,0 +1,115 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+from app.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class LoopMonitor:
+    """Opt-in watchdog that detects callbacks blocking the event loop.
+
+    A timer on the loop records a heartbeat every interval; a watchdog thread
+    notices when the heartbeat stalls past the threshold and captures the loop
+    thread's stack while it is still blocked, so the report points at the
+    offending frame rather than wherever the loop resumes.
+    """
+
+    def __init__(self, interval: float, threshold: float, max_reports_per_minute: int):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_reports_per_minute = max_reports_per_minute
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._last_beat = 0.0
+        self._reported_beat = 0.0
+        self._report_times = deque()
+        # Metrics
+        self.lags = deque(maxlen=1024)
+        self.blocked_count = 0
+        self.suppressed_reports = 0
+        self.max_blocked_ms = 0.0
+
+    def _beat(self):
+        now = time.monotonic()
+        lag = max(0.0, now - self._last_beat - self.interval)
+        self.lags.append(lag)
+        # The watchdog only sees a stall while it lasts; its full length is known here
+        if lag >= self.threshold:
+            self.max_blocked_ms = max(self.max_blocked_ms, lag * 1000)
+        self._last_beat = now
+        self._handle = self._loop.call_later(self.interval, self._beat)
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            last_beat = self._last_beat
+            blocked_for = time.monotonic() - last_beat
+            # Report each stall once, while the blocking frame is still on the stack
+            if blocked_for < self.threshold or last_beat == self._reported_beat:
+                continue
+            self._reported_beat = last_beat
+            self.blocked_count += 1
+            if not self._allow_report():
+                self.suppressed_reports += 1
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "<stack unavailable>"
+            logger.warning("Event loop blocked", extra={"blocked_ms": round(blocked_for * 1000), "threshold_ms": round(self.threshold * 1000), "stack": stack})
+
+    def _allow_report(self) -> bool:
+        now = time.monotonic()
+        while self._report_times and now - self._report_times[0] > 60:
+            self._report_times.popleft()
+        if len(self._report_times) >= self.max_reports_per_minute:
+            return False
+        self._report_times.append(now)
+        return True
+
+    def start(self):
+        """Start monitoring the running loop; call from inside the loop"""
+        if self._thread is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._handle = self._loop.call_later(self.interval, self._beat)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        if self._handle is not None:
+            self._handle.cancel()
+        self._thread.join(timeout=1)
+        self._thread = None
+
+    def stats(self) -> dict:
+        lags = sorted(self.lags)
+        def percentile(p):
+            return round(lags[min(int(p * len(lags)), len(lags) - 1)] * 1000, 2) if lags else None
+        return {
+            "enabled": self._thread is not None,
+            "lag_ms": {"p50": percentile(0.5), "p99": percentile(0.99), "max": percentile(1.0)},
+            "blocked_count": self.blocked_count,
+            "max_blocked_ms": round(self.max_blocked_ms, 2),
+            "suppressed_reports": self.suppressed_reports,
+        }
+
+
+loop_monitor = LoopMonitor(
+    interval=settings.LOOP_MONITOR_INTERVAL_MS / 1000,
+    threshold=settings.LOOP_MONITOR_THRESHOLD_MS / 1000,
+    max_reports_per_minute=settings.LOOP_MONITOR_MAX_REPORTS_PER_MINUTE,
+)
@@ -1,21 +1,44 @@
+from app.config import settings
 from app.db.mongo import mongodb
+from app.db.template_index import template_index
 from app.models.advertisements import AdvertisementTemplate
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def serialize_templates(templates: list[dict]) -> list[dict]:
+    """Convert ObjectId to string for JSON serialization"""
+    for template in templates:
+        template['_id'] = str(template['_id'])
+    return templates
 
 
 class ContentFetcher:
     def __init__(self):
         pass
 
-    async def fetch_templates(self, category="general") -> list[AdvertisementTemplate]:
-        """Fetch available templates from MongoDB"""
+    async def fetch_templates(self, category="general", query: str = None) -> list[AdvertisementTemplate]:
+        """Fetch available templates from MongoDB, ranked by relevance to the query when given"""
         if mongodb.client is None:
             raise Exception("MongoDB client is not initialized")
         
         templates_collection = mongodb.db.get_collection("advertisement_templates")
-        templates = await templates_collection.find().to_list(length=5)
-        for template in templates:
-            template['_id'] = str(template['_id'])  # Convert ObjectId to string for JSON serialization     
-        return templates
+        limit = settings.TEMPLATE_SUGGESTIONS
+        templates = None
+        if query:
+            try:
+                await template_index.refresh(templates_collection)
+                ranked_ids = template_index.top_k(query, limit)
+                if ranked_ids:
+                    found = await templates_collection.find({"id": {"$in": ranked_ids}}).to_list(length=limit)
+                    by_id = {template["id"]: template for template in found}
+                    templates = [by_id[template_id] for template_id in ranked_ids if template_id in by_id]
+            except Exception as e:
+                logger.warning("Template ranking failed, using default order", extra={"error": str(e)})
+        if not templates:
+            templates = await templates_collection.find().to_list(length=limit)
+        return serialize_templates(templates)
     
     async def fetch_template(self, template_id: str) -> dict:
         """Fetch a specific template by ID from MongoDB"""
@@ -0,0 +1,190 @@
+import asyncio
+import re
+import time
+import unicodedata
+from itertools import combinations
+from typing import Dict, List
+
+import numpy as np
+
+from app.config import settings
+from app.core.logger import get_logger
+from app.db.redis import redis, tagged_key
+
+logger = get_logger(__name__)
+
+TAGS_PER_POST = 5
+FALLBACK_TAGS = ["#ad", "#product", "#marketing", "#brand", "#promotion"]
+
+_TAG_RE = re.compile(r"\W+")
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def _fold(text: str) -> str:
+    # NFKC first so composed and decomposed accents (and full-width forms) fold to the same key
+    return unicodedata.normalize("NFKC", text or "").casefold()
+
+
+def normalize_tag(tag: str) -> str:
+    """Canonical form used as the index key: casefolded, no '#', no separators; any script"""
+    return _TAG_RE.sub("", _fold(tag))
+
+
+def _context_tokens(text: str) -> List[str]:
+    """Words and joined word pairs of the text, so "cold brew" can match #coldbrew"""
+    words = _TOKEN_RE.findall(_fold(text))
+    return words + [a + b for a, b in zip(words, words[1:])]
+
+
+class _Snapshot:
+    """Most frequent tags with their prior and normalized co-occurrence matrix"""
+
+    __slots__ = ("tags", "rows", "prior", "cooccurrence")
+
+    def __init__(self, tags: List[str], rows: Dict[str, int], prior: np.ndarray, cooccurrence: np.ndarray):
+        self.tags = tags
+        self.rows = rows
+        self.prior = prior
+        self.cooccurrence = cooccurrence
+
+
+_EMPTY = _Snapshot([], {}, np.zeros(0, dtype=np.float32), np.zeros((0, 0), dtype=np.float32))
+
+
+class HashtagIndex:
+    """Tag frequencies and co-occurrences of generated posts.
+
+    Counts are persisted in Redis sorted sets; lookups run against an in-memory
+    snapshot of the most frequent tags (a prior vector and a normalized
+    co-occurrence matrix) that is rebuilt periodically.
+    """
+
+    def __init__(self, max_tags: int = 1024):
+        self.max_tags = max_tags
+        self.redis_client = redis
+        # One hash tag so both sets share a cluster slot
+        self.frequency_key = tagged_key("hashtags", "frequency")
+        self.pairs_key = tagged_key("hashtags", "pairs")
+        self._snapshot = _EMPTY
+        self._refreshed_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._snapshot.tags)
+
+    async def record(self, tags: List[str]):
+        """Count one post's tags and every pair of them"""
+        tags = sorted({normalize_tag(tag) for tag in tags} - {""})
+        if not tags:
+            return
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for tag in tags:
+                    pipe.zincrby(self.frequency_key, 1, tag)
+                for a, b in combinations(tags, 2):
+                    pipe.zincrby(self.pairs_key, 1, f"{a}|{b}")
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("Hashtag index record failed", extra={"error": str(e)})
+
+    async def refresh(self, force: bool = False):
+        """Reload the most frequent tags and their pairs from Redis"""
+        if not force and time.monotonic() - self._refreshed_at < settings.HASHTAG_INDEX_REFRESH_SECONDS:
+            return
+        async with self._lock:
+            if not force and time.monotonic() - self._refreshed_at < settings.HASHTAG_INDEX_REFRESH_SECONDS:
+                return
+            # Marked first so a Redis outage does not turn every caption into a retry
+            self._refreshed_at = time.monotonic()
+            try:
+                frequencies = await self.redis_client.zrange(self.frequency_key, 0, self.max_tags - 1, desc=True, withscores=True)
+                pairs = await self.redis_client.zrange(self.pairs_key, 0, self.max_tags * 32 - 1, desc=True, withscores=True)
+            except Exception as e:
+                logger.warning("Hashtag index refresh failed", extra={"error": str(e)})
+                return
+            snapshot = await asyncio.to_thread(self._build, frequencies, pairs)
+            # Replaced as one object on the loop thread, so lookups never see a half-swapped index
+            self._snapshot = snapshot
+            logger.debug("Hashtag index refreshed", extra={"tags": len(snapshot.tags)})
+
+    @staticmethod
+    def _build(frequencies: list, pairs: list) -> _Snapshot:
+        tags = [tag for tag, _ in frequencies]
+        rows = {tag: row for row, tag in enumerate(tags)}
+        counts = np.array([count for _, count in frequencies], dtype=np.float32)
+        cooccurrence = np.zeros((len(tags), len(tags)), dtype=np.float32)
+        for pair, count in pairs:
+            a, _, b = pair.partition("|")
+            i, j = rows.get(a), rows.get(b)
+            if i is not None and j is not None:
+                cooccurrence[i, j] = cooccurrence[j, i] = count
+        if len(tags):
+            # Cosine-style normalization so common tags do not co-occur with everything
+            scale = 1.0 / np.sqrt(counts)
+            cooccurrence *= scale[:, None] * scale[None, :]
+            prior = np.log1p(counts)
+            prior /= prior.max()
+        else:
+            prior = counts
+        return _Snapshot(tags, rows, prior, cooccurrence)
+
+    def rank(self, proposed: List[str], context: str = "", k: int = TAGS_PER_POST) -> List[str]:
+        """Dedupe and re-rank proposed tags, topping up from tags related to them and the context"""
+        snapshot = self._snapshot
+        tags, rows, prior, cooccurrence = snapshot.tags, snapshot.rows, snapshot.prior, snapshot.cooccurrence
+        chosen: List[str] = []
+        for tag in proposed:
+            tag = normalize_tag(tag)
+            if tag and tag not in chosen:
+                chosen.append(tag)
+
+        if tags:
+            seeds = np.zeros(len(tags), dtype=np.float32)
+            for token in chosen + _context_tokens(context):
+                row = rows.get(token)
+                if row is not None:
+                    seeds[row] = 1.0
+            association = cooccurrence @ seeds
+
+            # Known tags move ahead by popularity and fit with the rest; unknown ones keep the model's order
+            def score(tag):
+                row = rows.get(tag)
+                return 0.0 if row is None else float(association[row] + prior[row])
+            chosen.sort(key=score, reverse=True)
+            chosen = chosen[:k]
+
+            missing = k - len(chosen)
+            if missing > 0:
+                candidates = association + 0.1 * prior
+                for tag in chosen:
+                    row = rows.get(tag)
+                    if row is not None:
+                        candidates[row] = -np.inf
+                if seeds.any():
+                    # Only suggest tags that actually relate to the post
+                    candidates[association <= 0] = -np.inf
+                available = int(np.isfinite(candidates).sum())
+                if available:
+                    take = min(missing, available)
+                    top = np.argpartition(-candidates, take - 1)[:take]
+                    chosen.extend(tags[i] for i in top[np.argsort(-candidates[top], kind="stable")])
+
+        tags_out = [f"#{tag}" for tag in chosen[:k]]
+        for fallback in FALLBACK_TAGS:
+            if len(tags_out) >= k:
+                break
+            if fallback not in tags_out:
+                tags_out.append(fallback)
+        return tags_out
+
+    def suggest(self, context: str, k: int = TAGS_PER_POST) -> List[str]:
+        """Tags for a post whose captioning produced none"""
+        return self.rank([], context, k)
+
+    @property
+    def ready(self) -> bool:
+        """Whether the index knows enough tags to stand in for model-proposed ones"""
+        return len(self._snapshot.tags) >= settings.HASHTAG_CAPTION_ONLY_MIN_TAGS
+
+
+hashtag_index = HashtagIndex(max_tags=settings.HASHTAG_INDEX_MAX_TAGS)
@@ -1,36 +1,44 @@
-from motor.motor_asyncio import AsyncIOMotorClient
-from beanie import init_beanie
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 from app.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+if TYPE_CHECKING:
+    from motor.motor_asyncio import AsyncIOMotorClient
 
 
 class MongoDB:
-    client: Optional[AsyncIOMotorClient] = None
+    client: Optional["AsyncIOMotorClient"] = None
     db = None
 
 mongodb = MongoDB()
 
 async def connect_to_mongo():
     """Initialize MongoDB connection and Beanie"""
+    # Imported lazily: motor and beanie are slow to import and only needed once connected
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from beanie import init_beanie
+
     try:
-        print(f"📡 Connecting to MongoDB at: {settings.MONGODB_URL}")
+        logger.info("Connecting to MongoDB")
         mongodb.client = AsyncIOMotorClient(settings.MONGODB_URL)
         mongodb.db = mongodb.client[settings.DATABASE_NAME]
         
         # Test the connection
         await mongodb.client.admin.command('ping')
-        print(f"🗄️  Connected to database: {settings.DATABASE_NAME}")
+        logger.info("Connected to database", extra={"database": settings.DATABASE_NAME})
         
         # Initialize Beanie with all document models
-        print("🔧 Initializing Beanie ODM...")
+        logger.debug("Initializing Beanie ODM")
         await init_beanie(
             database=mongodb.db,
             document_models=[]
         )
-        print("✅ Beanie ODM initialized successfully!")
+        logger.debug("Beanie ODM initialized")
         
     except Exception as e:
-        print(f"❌ MongoDB connection failed: {e}")
+        logger.error("MongoDB connection failed", extra={"error": str(e)})
         raise e
 
 async def close_mongo_connection():
@@ -4,7 +4,62 @@ import json
 import hashlib
 from datetime import timedelta
 
-redis = from_url(settings.REDIS_URL, decode_responses=True)
+
+def create_redis_client():
+    """Create the Redis client for the configured topology (standalone, sentinel or cluster)"""
+    options = {
+        "decode_responses": True,
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL,
+        "retry_on_timeout": True,
+    }
+    mode = settings.REDIS_MODE.lower()
+    if mode == "cluster":
+        from redis.asyncio.cluster import RedisCluster
+        options.pop("retry_on_timeout")
+        options.pop("health_check_interval")
+        return RedisCluster.from_url(settings.REDIS_URL, **options)
+    if mode == "sentinel":
+        from redis.asyncio.sentinel import Sentinel
+        sentinels = [
+            (host, int(port))
+            for host, _, port in (address.strip().rpartition(":") for address in settings.REDIS_SENTINELS.split(","))
+            if host
+        ]
+        sentinel = Sentinel(
+            sentinels,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            sentinel_kwargs={"password": settings.REDIS_SENTINEL_PASSWORD} if settings.REDIS_SENTINEL_PASSWORD else None,
+        )
+        return sentinel.master_for(
+            settings.REDIS_SENTINEL_MASTER,
+            password=settings.REDIS_PASSWORD,
+            db=settings.REDIS_DB,
+            **options,
+        )
+    if mode != "standalone":
+        raise ValueError(f"Unsupported REDIS_MODE: {settings.REDIS_MODE}")
+    return from_url(settings.REDIS_URL, **options)
+
+
+redis = create_redis_client()
+
+
+def tagged_key(tag: str, *parts: str) -> str:
+    """Build a versioned key whose hash tag pins it to the same cluster slot as other keys with that tag"""
+    return ":".join((settings.REDIS_KEY_PREFIX, f"{{{tag}}}") + tuple(str(part) for part in parts))
+
+
+def user_key(uid: str, *parts: str) -> str:
+    """Key owned by a user; all of a user's keys share the {u:<uid>} hash tag"""
+    return tagged_key(f"u:{uid}", *parts)
+
+
+def token_key(firebase_token: str) -> str:
+    """Key for a session looked up by Firebase token; the raw token is hashed, never stored as a key"""
+    return tagged_key(f"t:{hashlib.sha256(firebase_token.encode('utf-8')).hexdigest()[:32]}", "session")
 
 async def get_redis():
     return redis
@@ -21,18 +76,19 @@ class SessionManager:
             "name": user_data["name"],
             "email": user_data["email"],
             "uid": user_data["uid"],
+            "plan": user_data.get("plan"),  # Weights the user's LLM calls in the scheduler
         }
         
         # Store session data in Redis with TTL
         await self.redis_client.setex(
-            firebase_token,
+            token_key(firebase_token),
             self.session_ttl,
             json.dumps(session_data)
         )
 
         # Store session data in Redis with TTL
         await self.redis_client.setex(
-            user_data.get("uid"),
+            user_key(user_data.get("uid"), "session"),
             self.session_ttl,
             json.dumps(session_data)
         )
@@ -40,27 +96,27 @@ class SessionManager:
     
     async def get_session(self, firebase_token: str) -> dict:
         """Retrieve session data from Redis"""
-        session_data = await self.redis_client.get(firebase_token)
+        session_data = await self.redis_client.get(token_key(firebase_token))
         if session_data:
             return json.loads(session_data)
         return None
     
     async def delete_session(self, firebase_token: str) -> bool:
         """Delete session from Redis"""
-        result = await self.redis_client.delete(firebase_token)
+        result = await self.redis_client.delete(token_key(firebase_token))
         return result > 0
 
     async def extend_session(self, firebase_token: str) -> bool:
         """Extend session TTL"""
         session_data = await self.get_session(firebase_token)
         if session_data:
-            result = await self.redis_client.expire(firebase_token, self.session_ttl)
+            result = await self.redis_client.expire(token_key(firebase_token), self.session_ttl)
             return result
         return False
 
     async def get_data_by_uid(self, uid: str) -> dict:
         """Retrieve session data from Redis using UID"""
-        session_data = await self.redis_client.get(uid)
+        session_data = await self.redis_client.get(user_key(uid, "session"))
         if session_data:
             return json.loads(session_data)
         return None
@@ -71,7 +127,7 @@ class ChatSessionManager:
         self.chat_ttl = 600  # 7 days in seconds
     
     def _get_chat_key(self, uid: str) -> str:
-        return f"chat:{uid}"
+        return user_key(uid, "chat")
     
     async def store_chatbot_instance(self, uid: str, chatbot_instance_id: str) -> bool:
         """Store ChatbotService instance ID for a user"""
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import re
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _features(text: str) -> List[str]:
+    """Word unigrams, word bigrams and character trigrams of the given text"""
+    words = _TOKEN_RE.findall((text or "").lower())
+    features = list(words)
+    features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+    for word in words:
+        padded = f" {word} "
+        features.extend(f"#{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    return features
+
+
+def embed(text: str, n_features: int) -> np.ndarray:
+    """Embed text as an L2-normalized, signed, hashed n-gram vector.
+
+    crc32 is used instead of hash() so vectors stay stable across processes
+    and can be persisted next to the matrix.
+    """
+    vector = np.zeros(n_features, dtype=np.float32)
+    for feature in _features(text):
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % n_features] += 1.0 if (h >> 31) & 1 == 0 else -1.0
+    # Sublinear term frequency keeps long descriptions from dominating
+    np.copysign(np.log1p(np.abs(vector)), vector, out=vector)
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+def _template_text(template: dict) -> str:
+    return f"{template.get('title', '')} {template.get('description', '')}"
+
+
+def _signature(template: dict) -> int:
+    return zlib.crc32(_template_text(template).encode("utf-8"))
+
+
+class _IndexSnapshot:
+    """Rows of the index: one contiguous float32 matrix plus the row metadata"""
+
+    def __init__(self, n_features: int):
+        self.n_features = n_features
+        self.matrix = np.zeros((0, n_features), dtype=np.float32)
+        self.size = 0
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.signatures: Dict[str, int] = {}
+
+    def copy(self) -> "_IndexSnapshot":
+        clone = _IndexSnapshot(self.n_features)
+        clone.matrix = np.array(self.matrix[:max(self.size, 1)], dtype=np.float32)
+        clone.size = self.size
+        clone.ids = list(self.ids)
+        clone.rows = dict(self.rows)
+        clone.signatures = dict(self.signatures)
+        return clone
+
+    def _ensure_capacity(self, size: int):
+        if size <= self.matrix.shape[0] and self.matrix.flags.writeable:
+            return
+        capacity = max(size, self.matrix.shape[0] * 2, 16)
+        matrix = np.zeros((capacity, self.n_features), dtype=np.float32)
+        matrix[:self.size] = self.matrix[:self.size]
+        self.matrix = matrix
+
+    def _upsert(self, template_id: str, vector: np.ndarray, signature: int):
+        row = self.rows.get(template_id)
+        if row is None:
+            self._ensure_capacity(self.size + 1)
+            row = self.size
+            self.rows[template_id] = row
+            self.ids.append(template_id)
+            self.size += 1
+        else:
+            self._ensure_capacity(self.size)
+        self.matrix[row] = vector
+        self.signatures[template_id] = signature
+
+    def _remove(self, template_id: str):
+        row = self.rows.pop(template_id)
+        self.signatures.pop(template_id, None)
+        last = self.size - 1
+        self._ensure_capacity(self.size)
+        if row != last:
+            # Swap-remove keeps the live rows contiguous
+            moved_id = self.ids[last]
+            self.matrix[row] = self.matrix[last]
+            self.ids[row] = moved_id
+            self.rows[moved_id] = row
+        self.ids.pop()
+        self.size = last
+
+    def apply(self, templates: List[dict]) -> Tuple[int, int]:
+        """Synchronize the rows with the given templates; returns (embedded, removed)"""
+        seen = set()
+        changed = []
+        for template in templates:
+            template_id = template.get("id")
+            if template_id is None:
+                continue
+            seen.add(template_id)
+            signature = _signature(template)
+            if self.signatures.get(template_id) != signature:
+                changed.append((template_id, _template_text(template), signature))
+
+        for template_id, text, signature in changed:
+            self._upsert(template_id, embed(text, self.n_features), signature)
+
+        removed = [template_id for template_id in self.rows if template_id not in seen]
+        for template_id in removed:
+            self._remove(template_id)
+        return len(changed), len(removed)
+
+
+class TemplateIndex:
+    """In-memory cosine index over advertisement template descriptions.
+
+    Rows live in one contiguous float32 matrix so ranking is a single
+    matrix-vector product. Only templates whose text changed are re-embedded
+    on refresh, into a copy that replaces the current snapshot as a whole.
+    """
+
+    def __init__(self, n_features: int = 1024, path: Optional[str] = None):
+        self.n_features = n_features
+        self.path = Path(path) if path else None
+        self._snapshot = _IndexSnapshot(n_features)
+        self._refreshed_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return self._snapshot.size
+
+    def apply(self, templates: List[dict]) -> Tuple[int, int]:
+        """Synchronize the index with the given templates; returns (embedded, removed)"""
+        snapshot = self._snapshot.copy()
+        result = snapshot.apply(templates)
+        self._snapshot = snapshot
+        return result
+
+    def top_k(self, query: str, k: int = 5) -> List[str]:
+        """Return ids of the k templates most similar to the query"""
+        snapshot = self._snapshot
+        if snapshot.size == 0 or k <= 0:
+            return []
+        scores = snapshot.matrix[:snapshot.size] @ embed(query, self.n_features)
+        k = min(k, snapshot.size)
+        if k < snapshot.size:
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(snapshot.size)
+        ordered = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [snapshot.ids[i] for i in ordered]
+
+    async def refresh(self, collection, force: bool = False):
+        """Re-read template texts from Mongo and re-embed the changed ones"""
+        if not force and time.monotonic() - self._refreshed_at < settings.TEMPLATE_INDEX_REFRESH_SECONDS:
+            return
+        async with self._lock:
+            if not force and time.monotonic() - self._refreshed_at < settings.TEMPLATE_INDEX_REFRESH_SECONDS:
+                return
+            templates = await collection.find({}, {"_id": 0, "id": 1, "title": 1, "description": 1}).to_list(length=None)
+            snapshot = self._snapshot.copy()
+            embedded, removed = await asyncio.to_thread(snapshot.apply, templates)
+            # Assigned on the loop thread after the build, so lookups see either the old or the new snapshot
+            self._snapshot = snapshot
+            self._refreshed_at = time.monotonic()
+            if (embedded or removed) and self.path:
+                await asyncio.to_thread(self.save, snapshot)
+
+    def save(self, snapshot: Optional[_IndexSnapshot] = None):
+        """Persist the matrix as .npy and the row metadata as JSON"""
+        if not self.path:
+            return
+        snapshot = snapshot or self._snapshot
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        np.save(self.path.with_suffix(".npy"), np.ascontiguousarray(snapshot.matrix[:snapshot.size]))
+        with open(self.path.with_suffix(".json"), "w") as f:
+            json.dump({"n_features": self.n_features, "ids": snapshot.ids, "signatures": snapshot.signatures}, f)
+
+    def load(self) -> bool:
+        """Memory-map a previously saved index; returns False when none is available"""
+        if not self.path:
+            return False
+        matrix_path, meta_path = self.path.with_suffix(".npy"), self.path.with_suffix(".json")
+        if not matrix_path.exists() or not meta_path.exists():
+            return False
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("n_features") != self.n_features:
+            return False
+        snapshot = _IndexSnapshot(self.n_features)
+        snapshot.matrix = np.load(matrix_path, mmap_mode="r")
+        snapshot.ids = list(meta["ids"])
+        snapshot.size = len(snapshot.ids)
+        snapshot.rows = {template_id: row for row, template_id in enumerate(snapshot.ids)}
+        snapshot.signatures = {k: int(v) for k, v in meta["signatures"].items()}
+        self._snapshot = snapshot
+        return True
+
+
+template_index = TemplateIndex(
+    n_features=settings.TEMPLATE_INDEX_FEATURES,
+    path=settings.TEMPLATE_INDEX_PATH,
+)
+template_index.load()
@@ -1,47 +1,90 @@
 from contextlib import asynccontextmanager
+import asyncio
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import os
 
 from app.api.v1.api import api_router
+from app.api.v1.endpoints.ws import connection_stats
 from app.config import settings
-from app.db.mongo import connect_to_mongo, close_mongo_connection
+from app.core.loop_monitor import loop_monitor
+from app.db.mongo import connect_to_mongo, close_mongo_connection, mongodb
 from app.db.redis import redis
+from app.services.health_monitor import health_monitor
+from app.services.llm_scheduler import llm_scheduler
+from app.services.llm_service import OpenAIService
+from app.services.metering import usage_meter
+from app.services.upload_store import upload_store
+from app.core.logger import configure_logging, get_logger
+
+configure_logging()
+logger = get_logger(__name__)
+
+
+def register_health_checks():
+    """Register dependency probes sampled by the background health monitor"""
+    async def check_mongo():
+        if mongodb.client is None:
+            raise Exception("MongoDB client is not initialized")
+        await mongodb.client.admin.command('ping')
+
+    health_monitor.register("mongodb", check_mongo)
+    health_monitor.register("redis", redis.ping)
+    if settings.HEALTH_CHECK_LLM:
+        # The provider is not needed to serve existing sessions, so it does not gate readiness
+        health_monitor.register("llm", OpenAIService(api_key=settings.OPENAI_API_KEY).check_health, critical=False)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    print("🔄 Connecting to MongoDB...")
-    try:
-        await connect_to_mongo()
-        print("✅ MongoDB connection established successfully!")
-    except Exception as e:
-        print(f"❌ Failed to connect to MongoDB: {e}")
-        raise
-    
-    print("🔄 Connecting to Redis...")
-    try:
-        # Test Redis connection
-        await redis.ping()
-        print("✅ Redis connection established successfully!")
-    except Exception as e:
-        print(f"❌ Failed to connect to Redis: {e}")
-        raise
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+
+    # Startup: MongoDB and Redis are independent, so connect to both concurrently
+    async def start_mongo():
+        logger.info("Connecting to MongoDB")
+        try:
+            await connect_to_mongo()
+            logger.info("MongoDB connection established")
+        except Exception as e:
+            logger.error("Failed to connect to MongoDB", extra={"error": str(e)})
+            raise
+
+    async def start_redis():
+        logger.info("Connecting to Redis")
+        try:
+            # Test Redis connection
+            await redis.ping()
+            logger.info("Redis connection established")
+        except Exception as e:
+            logger.error("Failed to connect to Redis", extra={"error": str(e)})
+            raise
+
+    await asyncio.gather(start_mongo(), start_redis())
+
+    register_health_checks()
+    await health_monitor.start()
+    usage_meter.start()
     
     yield
     
     # Shutdown
-    print("🔄 Closing MongoDB connection...")
+    await health_monitor.stop()
+    await usage_meter.stop()
+    loop_monitor.stop()
+    upload_store.close()
+
+    logger.info("Closing MongoDB connection")
     await close_mongo_connection()
-    print("✅ MongoDB connection closed successfully!")
+    logger.info("MongoDB connection closed")
     
-    print("🔄 Closing Redis connection...")
+    logger.info("Closing Redis connection")
     try:
         await redis.aclose()
-        print("✅ Redis connection closed successfully!")
+        logger.info("Redis connection closed")
     except Exception as e:
-        print(f"⚠️ Error closing Redis connection: {e}")
+        logger.warning("Error closing Redis connection", extra={"error": str(e)})
 
 app = FastAPI(
     version="1.0.0",
@@ -70,36 +113,33 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint that verifies MongoDB and Redis connections"""
-    health_status = {"status": "healthy"}
-    
-    # Check MongoDB connection
-    try:
-        from app.db.mongo import mongodb
-        if mongodb.client is None:
-            health_status["database"] = "disconnected"
-            health_status["status"] = "unhealthy"
-        else:
-            # Test database connection
-            await mongodb.client.admin.command('ping')
-            health_status["database"] = "connected"
-            health_status["database_name"] = settings.DATABASE_NAME
-    except Exception as e:
-        health_status["database"] = "error"
-        health_status["database_error"] = str(e)
-        health_status["status"] = "unhealthy"
-    
-    # Check Redis connection
-    try:
-        await redis.ping()
-        health_status["redis"] = "connected"
-    except Exception as e:
-        health_status["redis"] = "error"
-        health_status["redis_error"] = str(e)
-        health_status["status"] = "unhealthy"
-    
+    """Detailed dependency status from the background health monitor"""
+    health_status = health_monitor.status()
+    dependencies = health_status["dependencies"]
+    health_status["database"] = "connected" if dependencies["mongodb"]["status"] == "healthy" else "error"
+    health_status["database_name"] = settings.DATABASE_NAME
+    health_status["redis"] = "connected" if dependencies["redis"]["status"] == "healthy" else "error"
+    if settings.LOOP_MONITOR_ENABLED:
+        health_status["event_loop"] = loop_monitor.stats()
+    if settings.LLM_SCHEDULER_ENABLED:
+        health_status["llm_scheduler"] = llm_scheduler.stats()
+    health_status["websockets"] = connection_stats()
     return health_status
 
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness probe: the event loop is responsive and the monitor is cycling"""
+    if not health_monitor.live:
+        return JSONResponse(status_code=503, content={"status": "dead"})
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: all critical dependencies are healthy (cached, no I/O)"""
+    if not health_monitor.ready:
+        return JSONResponse(status_code=503, content={"status": "not_ready"})
+    return {"status": "ready"}
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     return JSONResponse(
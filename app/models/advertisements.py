@@ -15,10 +15,24 @@ class AdvertisementTemplate(BaseModel):
         }
     
 
-class ImageCaptionTags(BaseModel):
+class ImageCaption(BaseModel):
     caption: str
+
+class ImageCaptionTags(ImageCaption):
     tags: List[str]
 
+class IndexedImageCaption(ImageCaption):
+    image_index: int = Field(description="1-based position of the image this caption belongs to")
+
+class IndexedImageCaptionTags(ImageCaptionTags):
+    image_index: int = Field(description="1-based position of the image this caption belongs to")
+
+class ImageCaptionBatch(BaseModel):
+    captions: List[IndexedImageCaption] = Field(default_factory=list, description="One caption entry per given image.")
+
+class ImageCaptionTagsBatch(BaseModel):
+    captions: List[IndexedImageCaptionTags] = Field(default_factory=list, description="One caption and tags entry per given image.")
+
 class ImageDescriptions(BaseModel):
     descriptions: List[str] = Field(default_factory=list, description="List of 3 different description of a advertisement post image targetting 3 different audiences in less than 30 words.")
 
@@ -1,4 +1,5 @@
 from enum import IntEnum
+from typing import Optional
 from pydantic import BaseModel
 
 
@@ -13,3 +14,18 @@ class LLMModel(BaseModel):
     provider: ProviderType
     api_key: str
 
+class ImageGenerationOptions(BaseModel):
+    use_cache: bool = True  # Set to False to always call the provider
+    quality: Optional[str] = None  # Provider quality, e.g. "low" for drafts; provider default when None
+    size: Optional[str] = None
+    partial_images: Optional[int] = None  # Previews to stream; settings.IMAGE_PREVIEW_PARTIALS when None
+
+    def tool_options(self) -> dict:
+        """Provider image tool parameters that change the rendered image"""
+        return {key: value for key, value in (("quality", self.quality), ("size", self.size)) if value is not None}
+
+class ImageStreamEvent(BaseModel):
+    partial: bool  # True for low-resolution previews, False for the finished image
+    partial_index: int = 0
+    image_b64: str
+    cache_key: Optional[str] = None  # Image cache entry holding the finished image, when it was cached
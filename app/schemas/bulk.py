@@ -0,0 +1,27 @@
+from typing import Optional
+from pydantic import BaseModel
+
+
+class ProductBrief(BaseModel):
+    product_name: str
+    description: str
+    target_audience: str
+    platform: str = "Instagram"  # Used as the template description when no template_id is given
+    template_id: Optional[str] = None
+
+    def to_message(self) -> str:
+        """Render the brief as the user turn of a conversation"""
+        return (
+            f"Product Name: {self.product_name}\n"
+            f"Product Description: {self.description}\n"
+            f"Target Audience: {self.target_audience}"
+        )
+
+
+class BulkJobStatus(BaseModel):
+    job_id: str
+    status: str  # "running", "completed" or "failed"
+    total: int
+    completed: int
+    failed: int
+    created_at: str
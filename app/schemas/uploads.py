@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+
+class UploadedImage(BaseModel):
+    upload_id: str  # Reference this id in chat messages instead of sending the image
+    width: int
+    height: int
+    bytes: int  # Size of the processed image
+    deduplicated: bool  # True when identical content had already been uploaded
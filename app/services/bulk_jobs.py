@@ -0,0 +1,179 @@
+import asyncio
+import json
+import shutil
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+from pydantic import ValidationError
+
+from app.config import settings
+from app.db.redis import redis, tagged_key
+from app.schemas.bulk import BulkJobStatus, ProductBrief
+from app.services.post_generator import PostGenerator
+from app.core.logger import bind_context, get_logger
+from app.services.llm_scheduler import bind_scheduling
+from app.utils.data_uri import PNG_PREFIX, png_bytes
+
+logger = get_logger(__name__)
+
+_RESULTS_PAGE = 100
+
+
+class BulkJobManager:
+    """Runs bulk generation jobs in the background and keeps their results in Redis.
+
+    Results are appended to a Redis list as they complete, so a client can drop
+    the connection and resume streaming from any offset with the job id. The
+    images are written to disk per job; results only reference them.
+    """
+
+    def __init__(self, image_dir: str):
+        self.redis_client = redis
+        self.job_ttl = settings.BULK_JOB_TTL
+        self.image_dir = Path(image_dir)
+        self.post_generator = PostGenerator()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def _job_key(self, job_id: str) -> str:
+        return tagged_key(f"bulk:{job_id}", "job")
+
+    def _results_key(self, job_id: str) -> str:
+        return tagged_key(f"bulk:{job_id}", "results")
+
+    def image_path(self, job_id: str, image_ref: str) -> Path:
+        return self.image_dir / job_id / f"{image_ref}.png"
+
+    def _write_image(self, job_id: str, image_ref: str, image_url: str):
+        path = self.image_path(job_id, image_ref)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(png_bytes(image_url))
+
+    def _remove_expired_images(self):
+        """Delete image directories of jobs whose results have expired"""
+        if not self.image_dir.exists():
+            return
+        cutoff = time.time() - self.job_ttl
+        for job_dir in self.image_dir.iterdir():
+            if job_dir.is_dir() and job_dir.stat().st_mtime < cutoff:
+                shutil.rmtree(job_dir, ignore_errors=True)
+
+    async def _store_images(self, job_id: str, index: int, templates: List[dict]) -> List[dict]:
+        """Write the templates' images to disk and replace them with image_ref ids"""
+        stored = []
+        for number, template in enumerate(templates):
+            template = dict(template)
+            image_url = template.pop("image_url", None) or ""
+            if image_url.startswith(PNG_PREFIX):
+                image_ref = f"{index}-{number}"
+                await asyncio.to_thread(self._write_image, job_id, image_ref, image_url)
+                template["image_ref"] = image_ref
+            stored.append(template)
+        return stored
+
+    async def create_job(self, uid: str, lines: AsyncIterator[str], plan: Optional[str] = None) -> BulkJobStatus:
+        """Parse JSONL briefs, record the job and start processing it"""
+        briefs: List[Optional[ProductBrief]] = []
+        errors: Dict[int, str] = {}
+        async for line in lines:
+            if not line.strip():
+                continue
+            if len(briefs) >= settings.BULK_MAX_ITEMS:
+                raise ValueError(f"A bulk job can contain at most {settings.BULK_MAX_ITEMS} briefs")
+            try:
+                briefs.append(ProductBrief.model_validate_json(line))
+            except ValidationError as e:
+                errors[len(briefs)] = f"Invalid brief: {e.errors()[0].get('msg')}"
+                briefs.append(None)
+        if not briefs:
+            raise ValueError("No product briefs found in upload")
+
+        await asyncio.to_thread(self._remove_expired_images)
+        job_id = uuid.uuid4().hex
+        status = BulkJobStatus(
+            job_id=job_id,
+            status="running",
+            total=len(briefs),
+            completed=0,
+            failed=0,
+            created_at=datetime.now().isoformat(),
+        )
+        job_key = self._job_key(job_id)
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(job_key, mapping={**status.model_dump(), "uid": uid})
+            pipe.expire(job_key, self.job_ttl)
+            await pipe.execute()
+
+        self._tasks[job_id] = asyncio.create_task(self._run(job_id, uid, briefs, errors, plan))
+        self._tasks[job_id].add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        return status
+
+    async def _run(self, job_id: str, uid: str, briefs: List[Optional[ProductBrief]], errors: Dict[int, str], plan: Optional[str]):
+        # Attribute logs, metered usage and LLM scheduling of the whole job to its owner
+        bind_context(uid=uid, trace_id=job_id)
+        bind_scheduling(plan=plan, job_class="bulk")
+        semaphore = asyncio.Semaphore(settings.BULK_CONCURRENCY)
+
+        async def process(index: int, brief: Optional[ProductBrief]):
+            if brief is None:
+                await self._record(job_id, {"index": index, "success": False, "error": errors[index]})
+                return
+            async with semaphore:
+                try:
+                    final = await self.post_generator.generate_posts(brief)
+                    result = {
+                        "index": index,
+                        "success": True,
+                        "product_name": brief.product_name,
+                        "templates": await self._store_images(job_id, index, final["templates"]),
+                        "stats": final["stats"],
+                    }
+                except Exception as e:
+                    result = {"index": index, "success": False, "product_name": brief.product_name, "error": str(e)}
+            await self._record(job_id, result)
+
+        try:
+            await asyncio.gather(*(process(i, brief) for i, brief in enumerate(briefs)))
+            await self.redis_client.hset(self._job_key(job_id), "status", "completed")
+        except Exception as e:
+            logger.error("Bulk job failed", extra={"job_id": job_id, "error": str(e)})
+            await self.redis_client.hset(self._job_key(job_id), "status", "failed")
+
+    async def _record(self, job_id: str, result: dict):
+        """Append a result and update the job counters"""
+        result["timestamp"] = datetime.now().isoformat()
+        job_key, results_key = self._job_key(job_id), self._results_key(job_id)
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.rpush(results_key, json.dumps(result))
+            pipe.expire(results_key, self.job_ttl)
+            pipe.hincrby(job_key, "completed" if result["success"] else "failed", 1)
+            await pipe.execute()
+
+    async def get_status(self, job_id: str, uid: str) -> Optional[BulkJobStatus]:
+        """Return job status, or None if the job does not exist or belongs to another user"""
+        data = await self.redis_client.hgetall(self._job_key(job_id))
+        if not data or data.get("uid") != uid:
+            return None
+        return BulkJobStatus(**{k: v for k, v in data.items() if k != "uid"})
+
+    async def stream_results(self, job_id: str, offset: int = 0) -> AsyncIterator[str]:
+        """Yield NDJSON lines from offset until the job has finished"""
+        job_key, results_key = self._job_key(job_id), self._results_key(job_id)
+        while True:
+            status = await self.redis_client.hget(job_key, "status")
+            while True:
+                results = await self.redis_client.lrange(results_key, offset, offset + _RESULTS_PAGE - 1)
+                for result in results:
+                    yield result + "\n"
+                offset += len(results)
+                if len(results) < _RESULTS_PAGE:
+                    break
+            # Check status before reading so results written just before completion are not missed
+            if status != "running":
+                break
+            await asyncio.sleep(settings.BULK_POLL_INTERVAL)
+
+
+bulk_job_manager = BulkJobManager(settings.BULK_IMAGE_DIR)
@@ -1,23 +1,52 @@
-from app.services.llm_service import OpenAIService
+from app.services.llm_service import LLMService, create_llm_service
 from app.config import settings
 from datetime import datetime
 from app.db.database import ContentFetcher
 from app.prompts.prompts import Prompts
-from app.models.advertisements import ImageCaptionTags, ImageDescriptions
-import base64
+from app.db.hashtag_index import FALLBACK_TAGS, hashtag_index
+from app.services.upload_store import upload_store
+from app.models.advertisements import ImageCaption, ImageCaptionBatch, ImageCaptionTags, ImageCaptionTagsBatch, ImageDescriptions
+from app.models.llm_models import ImageGenerationOptions
+from app.utils.llm_config import get_model_by_name
+from app.utils.memory import payload_size
+from collections import OrderedDict
+from typing import Dict, Optional
 import asyncio
+import time
+import uuid
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
 
 class ChatbotService:
-    def __init__(self, system_prompt: str = None):
-        self.llm_service = OpenAIService(api_key=settings.OPENAI_API_KEY)
+    def __init__(self, system_prompt: str = None, llm_service: LLMService = None):
+        self.llm_service = llm_service or create_llm_service("openai", settings.OPENAI_API_KEY)
         self.conversation_history = []
         self.system_prompt = system_prompt
         self.content_fetcher = ContentFetcher()
+        # Image descriptions started ahead of time for suggested templates, keyed by template id
+        self._speculative_descriptions: Dict[str, asyncio.Task] = {}
+        # Description and caption of recent draft variants, keyed by variant id, least recently used first.
+        # Generations can run in parallel, so each one adds its variants rather than replacing the others'
+        self._drafts: "OrderedDict[str, dict]" = OrderedDict()
+        # Processed uploads referenced by the conversation, resolved to data URIs once
+        self._upload_urls: Dict[str, str] = {}
     
-    async def process_user_message(self, user_message: str):
-        """Process user message and return chatbot response"""
-        self.conversation_history.append({"role": "user", "content": user_message})
-        response = await self.llm_service.generate_text("gpt-4o", [{"role": "system", "content": self.system_prompt}] + self.conversation_history)
+    async def process_user_message(self, user_message: str, upload_ids: Optional[list[str]] = None):
+        """Process user message and return chatbot response.
+
+        upload_ids reference product photos from the upload store; the history
+        keeps only the ids and the downscaled images are attached per call.
+        """
+        # Any new message changes the conversation, so earlier speculation is stale
+        self._cancel_speculative_descriptions()
+        if upload_ids:
+            content = [{"type": "input_text", "text": user_message}]
+            content.extend({"type": "input_image", "upload_id": upload_id} for upload_id in upload_ids)
+            self.conversation_history.append({"role": "user", "content": content})
+        else:
+            self.conversation_history.append({"role": "user", "content": user_message})
+        response = await self.llm_service.generate_text("gpt-4o", [{"role": "system", "content": self.system_prompt}] + await self._history())
         self.conversation_history.append({"role": "assistant", "content": response})
 
         yield {
@@ -31,7 +60,7 @@ class ChatbotService:
 
         # Suggest templates if certain keywords are detected
         if "READY FOR AD GENERATION" in response:
-            print("Triggering template suggestions...")
+            logger.info("Triggering template suggestions")
             yield {
                 "category": "text",
                 "role": "assistant",
@@ -41,15 +70,104 @@ class ChatbotService:
                 "loading": True
             }
 
+            templates = await self.content_fetcher.fetch_templates(query=self._conversation_text())
+            self._start_speculative_descriptions(templates)
+
             yield {
-                "templates": await self.content_fetcher.fetch_templates(),
+                "templates": templates,
                 "category": "template_suggestion",
                 "timestamp": datetime.now().isoformat(),
                 "loading": False
             }
 
+    def _conversation_text(self) -> str:
+        """Plain text of what the user has said so far, used to rank templates"""
+        texts = []
+        for message in self.conversation_history:
+            if message["role"] != "user":
+                continue
+            if isinstance(message["content"], str):
+                texts.append(message["content"])
+            else:
+                texts.extend(part["text"] for part in message["content"] if part.get("type") == "input_text")
+        return " ".join(texts)
+
+    async def _history(self) -> list[dict]:
+        """Conversation history in provider format, with upload references replaced by the images"""
+        upload_ids = [
+            part["upload_id"]
+            for message in self.conversation_history if not isinstance(message["content"], str)
+            for part in message["content"] if "upload_id" in part
+        ]
+        if not upload_ids:
+            return self.conversation_history
+        missing = [upload_id for upload_id in dict.fromkeys(upload_ids) if upload_id not in self._upload_urls]
+        if missing:
+            urls = await asyncio.gather(*(upload_store.data_uri(upload_id) for upload_id in missing))
+            self._upload_urls.update(zip(missing, urls))
+
+        history = []
+        for message in self.conversation_history:
+            if isinstance(message["content"], str):
+                history.append(message)
+                continue
+            content = [
+                {"type": "input_image", "image_url": self._upload_urls[part["upload_id"]]} if "upload_id" in part else part
+                for part in message["content"]
+            ]
+            history.append({**message, "content": content})
+        return history
+
+    def _start_speculative_descriptions(self, templates: list[dict]):
+        """Start image descriptions for suggested templates while the user picks one"""
+        self._cancel_speculative_descriptions()
+        budget = max(settings.SPECULATIVE_DESCRIPTIONS_BUDGET, 0)
+        for template in templates[:budget]:
+            template_id = template.get("id")
+            if template_id is None or template_id in self._speculative_descriptions:
+                continue
+            self._speculative_descriptions[template_id] = asyncio.create_task(self.image_descriptions(template))
+
+    def _cancel_speculative_descriptions(self):
+        """Cancel all pending speculative image descriptions"""
+        for task in self._speculative_descriptions.values():
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                # Retrieve the discarded outcome so a failed speculation is not reported as unhandled
+                task.exception()
+        self._speculative_descriptions.clear()
+
+    def cancel_pending(self):
+        """Cancel background work started for this conversation, e.g. when the client goes away"""
+        self._cancel_speculative_descriptions()
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Approximate bytes held by this conversation's state"""
+        return {
+            "history": payload_size(self.conversation_history),
+            "uploads": payload_size(self._upload_urls),
+            "drafts": payload_size(self._drafts),
+        }
+
+    async def _take_speculative_descriptions(self, template: dict) -> Optional[ImageDescriptions]:
+        """Adopt the speculative result for the picked template and cancel the rest"""
+        task = self._speculative_descriptions.pop(template.get("id"), None)
+        self._cancel_speculative_descriptions()
+        if task is None:
+            return None
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if task.cancelled():
+                return None
+            raise
+        except Exception as e:
+            logger.warning("Speculative image descriptions failed, regenerating", extra={"error": str(e)})
+            return None
+
     async def generate_image(self, template: dict, image_description: str = None):
-        print("Generating image for template:", template)
+        logger.debug("Generating image for template", extra={"template_id": template.get("id")})
         """Generate image based on the selected template"""
         # Placeholder for image generation logic
 
@@ -58,33 +176,84 @@ class ChatbotService:
         return base64_image
 
 
+    @staticmethod
+    def _caption_only() -> bool:
+        """Whether tags come from the hashtag index instead of the model"""
+        return settings.HASHTAG_INDEX_ENABLED and settings.HASHTAG_CAPTION_ONLY and hashtag_index.ready
+
     async def caption_tags(self, base64_image: str) -> ImageCaptionTags:
         """Generate caption and tags for the given image URL"""
         system_prompt = Prompts.AD_TEXT_GENERATION_PROMPT.value
-        response: ImageCaptionTags = await self.llm_service.generate_structured_output(
+        caption_only = self._caption_only()
+        response = await self.llm_service.generate_structured_output(
             "gpt-4o", 
-            [{"role": "system", "content": system_prompt}] + self.conversation_history + [{"role": "user", "content": [
-                { "type": "input_text", "text": "Generate caption in less than 15 words and 5 tags for the given image" },
+            [{"role": "system", "content": system_prompt}] + await self._history() + [{"role": "user", "content": [
+                { "type": "input_text", "text": "Generate caption in less than 15 words for the given image" if caption_only else "Generate caption in less than 15 words and 5 tags for the given image" },
                 {
                     "type": "input_image",
                     "image_url": f"data:image/jpeg;base64,{base64_image}",
                 },
-            ]}], ImageCaptionTags)
+            ]}], ImageCaption if caption_only else ImageCaptionTags)
+        if caption_only:
+            # Tags are filled in from the hashtag index when the template is built
+            return ImageCaptionTags(caption=response.caption, tags=[])
         return response
 
+    async def caption_tags_batch(self, base64_images: list[str]) -> list[Optional[ImageCaptionTags]]:
+        """Generate caption and tags for several images in one call, aligned by image index.
+
+        Entries the model did not return are None so callers can caption them individually.
+        """
+        system_prompt = Prompts.AD_TEXT_GENERATION_PROMPT.value
+        caption_only = self._caption_only()
+        asked_for = "caption in less than 15 words" if caption_only else "caption in less than 15 words and 5 tags"
+        content = [{
+            "type": "input_text",
+            "text": f"Generate {asked_for} for each of the following {len(base64_images)} images. Return one entry per image with image_index set to the image number."
+        }]
+        for index, base64_image in enumerate(base64_images):
+            content.append({"type": "input_text", "text": f"Image {index + 1}:"})
+            content.append({"type": "input_image", "image_url": f"data:image/jpeg;base64,{base64_image}"})
+
+        response = await self.llm_service.generate_structured_output(
+            "gpt-4o",
+            [{"role": "system", "content": system_prompt}] + await self._history() + [{"role": "user", "content": content}],
+            ImageCaptionBatch if caption_only else ImageCaptionTagsBatch)
+
+        aligned: list[Optional[ImageCaptionTags]] = [None] * len(base64_images)
+        for item in response.captions:
+            position = item.image_index - 1
+            if 0 <= position < len(aligned) and aligned[position] is None:
+                aligned[position] = ImageCaptionTags(caption=item.caption, tags=getattr(item, "tags", []))
+        return aligned
+
     async def image_descriptions(self, template: dict) -> ImageDescriptions:
         """Generate image descriptions for the given image URL"""
         system_prompt = Prompts.AD_IMAGE_DESCRIPTION_PROMPT.value
         response: ImageDescriptions = await self.llm_service.generate_structured_output(
             "gpt-4o", 
-            [{"role": "system", "content": system_prompt}] + self.conversation_history + [{"role": "user", "content": f"Generate 3 different type of images descriptions describing image in text focusing on the conversation motive for platform: {template.get('description')}" }], ImageDescriptions)
+            [{"role": "system", "content": system_prompt}] + await self._history() + [{"role": "user", "content": f"Generate 3 different type of images descriptions describing image in text focusing on the conversation motive for platform: {template.get('description')}" }], ImageDescriptions)
         return response
 
-    async def generate_templates(self, template: dict):
-        """Generate 3 different advertisement templates based on image instructions"""
-        print("generating descriptions")
-        descriptions: ImageDescriptions = await self.image_descriptions(template)
-        print("descriptions generated:", descriptions)
+    @staticmethod
+    def _image_messages(description: str) -> list[dict]:
+        return [
+            {"role": "system", "content": Prompts.AD_IMAGE_GENERATION_PROMPT.value},
+            {"role": "user", "content": f"Generate image on the basis of this description: {description}"},
+        ]
+
+    async def generate_templates(self, template: dict, draft: bool = False, previews: bool = True):
+        """Generate 3 different advertisement templates based on image instructions.
+
+        In draft mode the variants are rendered cheaply and without previews; the
+        one the user picks is re-rendered with finalize_template. Callers that
+        only want the final templates pass previews=False so none are requested.
+        """
+        logger.debug("Generating image descriptions", extra={"template_id": template.get("id")})
+        descriptions: Optional[ImageDescriptions] = await self._take_speculative_descriptions(template)
+        if descriptions is None:
+            descriptions = await self.image_descriptions(template)
+        logger.debug("Image descriptions ready", extra={"count": len(descriptions.descriptions)})
         yield {
             "category": "text",
             "role": "assistant",
@@ -93,24 +262,64 @@ class ChatbotService:
             "loading": False
         }
 
+        image_model, image_options = "gpt-5", None if previews else ImageGenerationOptions(partial_images=0)
+        if draft:
+            image_model = get_model_by_name(settings.IMAGE_DRAFT_MODEL).model_id
+            image_options = ImageGenerationOptions(quality=settings.IMAGE_DRAFT_QUALITY, size=settings.IMAGE_DRAFT_SIZE, partial_images=0)
+
+        # Previews from all variants are funnelled through one queue so they can be yielded as they arrive
+        preview_queue: asyncio.Queue = asyncio.Queue()
+
         # Run image generation in parallel with error handling
         async def generate_single_image(des, index):
             try:
-                system_content = Prompts.AD_IMAGE_GENERATION_PROMPT.value
-                # Generate image (returns bytes)
-                image_bytes = await self.llm_service.generate_image("gpt-5", [{"role": "system", "content": system_content}, {"role": "user", "content": f"Generate image on the basis of this description: {des}"}])
-                
-                # Convert bytes to base64 string
-                base64_image = base64.b64encode(image_bytes).decode('utf-8')
-                print(f"Successfully generated image {index + 1}")
-                return {"success": True, "image": base64_image, "description": des, "index": index}
+                final_event = None
+                async for event in self.llm_service.generate_image_stream(image_model, self._image_messages(des), image_options):
+                    if event.partial:
+                        preview_queue.put_nowait((index, event.image_b64))
+                    else:
+                        final_event = event
+                if final_event is None:
+                    raise Exception("No image data found in response")
+                logger.debug("Generated image", extra={"index": index, "bytes": len(final_event.image_b64)})
+                return {"success": True, "image": final_event.image_b64, "image_ref": final_event.cache_key, "description": des, "index": index}
             except Exception as e:
-                print(f"Failed to generate image {index + 1}: {str(e)}")
+                logger.warning("Failed to generate image", extra={"index": index, "error": str(e)})
                 return {"success": False, "error": str(e), "description": des, "index": index}
 
-        # Generate all images in parallel
+        # Generate all images in parallel, forwarding throttled previews meanwhile
         image_tasks = [generate_single_image(des, i) for i, des in enumerate(descriptions.descriptions)]
-        image_results = await asyncio.gather(*image_tasks, return_exceptions=True)
+        image_gather = asyncio.gather(*image_tasks, return_exceptions=True)
+        last_preview_at = {}
+        next_preview = None
+        try:
+            while not image_gather.done():
+                next_preview = asyncio.ensure_future(preview_queue.get())
+                done, _ = await asyncio.wait({next_preview, image_gather}, return_when=asyncio.FIRST_COMPLETED)
+                if next_preview not in done:
+                    next_preview.cancel()
+                    continue
+                index, preview_b64 = next_preview.result()
+                now = time.monotonic()
+                if now - last_preview_at.get(index, 0) < settings.IMAGE_PREVIEW_MIN_INTERVAL:
+                    continue
+                last_preview_at[index] = now
+                yield {
+                    "category": "image_preview",
+                    "index": index,
+                    "image_url": f"data:image/png;base64,{preview_b64}",
+                    "timestamp": datetime.now().isoformat(),
+                    "loading": True
+                }
+        finally:
+            # Also reached when the consumer is cancelled: stop the image requests still in flight
+            if next_preview is not None and not next_preview.done():
+                next_preview.cancel()
+            if not image_gather.done():
+                image_gather.cancel()
+                # Nobody awaits the gather any more; retrieve its outcome so it is not reported as lost
+                image_gather.add_done_callback(lambda future: future.cancelled() or future.exception())
+        image_results = image_gather.result()
 
         # Filter successful image results
         successful_images = []
@@ -118,34 +327,50 @@ class ChatbotService:
             if isinstance(result, dict) and result.get("success"):
                 successful_images.append(result)
             elif isinstance(result, Exception):
-                print(f"Image generation exception: {str(result)}")
+                logger.error("Image generation exception", extra={"error": str(result)})
         
-        print(f"Successfully generated {len(successful_images)} out of {len(descriptions.descriptions)} images")
+        logger.info("Image generation finished", extra={"successful": len(successful_images), "requested": len(descriptions.descriptions)})
         
-        # Generate captions and tags in parallel for successful images only
-        async def generate_caption_with_error_handling(image_data):
+        if settings.HASHTAG_INDEX_ENABLED:
+            await hashtag_index.refresh()
+
+        # Caption all successful images in one call; only images it misses are captioned individually
+        batch_captions: list[Optional[ImageCaptionTags]] = [None] * len(successful_images)
+        if settings.CAPTION_BATCH_ENABLED and len(successful_images) > 1:
+            try:
+                batch_captions = await self.caption_tags_batch([image_data["image"] for image_data in successful_images])
+            except Exception as e:
+                logger.warning("Batch captioning failed, captioning images individually", extra={"error": str(e)})
+
+        async def generate_caption_with_error_handling(image_data, batch_caption):
+            if batch_caption is not None:
+                return {"success": True, "caption_tags": batch_caption, "image_data": image_data}
             try:
                 caption_tags = await self.caption_tags(image_data["image"])
-                print(f"Successfully generated caption for image {image_data['index'] + 1}")
+                logger.debug("Generated caption", extra={"index": image_data["index"]})
                 return {"success": True, "caption_tags": caption_tags, "image_data": image_data}
             except Exception as e:
-                print(f"Failed to generate caption for image {image_data['index'] + 1}: {str(e)}")
+                logger.warning("Failed to generate caption", extra={"index": image_data["index"], "error": str(e)})
                 # Return default caption and tags on failure
                 return {
                     "success": False, 
                     "caption_tags": ImageCaptionTags(
                         caption="Amazing advertisement!", 
-                        tags=["#ad", "#product", "#marketing", "#brand", "#promotion"]
+                        tags=[] if settings.HASHTAG_INDEX_ENABLED else FALLBACK_TAGS
                     ), 
                     "image_data": image_data,
                     "error": str(e)
                 }
         
-        caption_tasks = [generate_caption_with_error_handling(img_data) for img_data in successful_images]
+        caption_tasks = [
+            generate_caption_with_error_handling(img_data, batch_caption)
+            for img_data, batch_caption in zip(successful_images, batch_captions)
+        ]
         caption_results = await asyncio.gather(*caption_tasks, return_exceptions=True)
 
         # Filter successful caption results and create templates
         final_templates = []
+        tags_to_record = []
         successful_captions = 0
         failed_captions = 0
         
@@ -165,16 +390,36 @@ class ChatbotService:
                     "description": image_data["description"],
                     "image_url": f"data:image/png;base64,{image_data['image']}",
                     "caption": caption_tags.caption,
-                    "tags": caption_tags.tags,
+                    "tags": self._rank_tags(caption_tags, image_data["description"]),
                     "template_number": len(final_templates) + 1,
                     "original_index": image_data["index"]
                 }
+                if image_data["image_ref"]:
+                    # Lets the event log keep the cached image by reference
+                    template["image_ref"] = image_data["image_ref"]
                 
                 if not result.get("success"):
                     template["caption_warning"] = "Used default caption due to generation failure"
+                elif settings.HASHTAG_INDEX_ENABLED and caption_tags.tags:
+                    # Only the model's own proposals: recording the index's suggestions (or the
+                    # fallbacks) would feed its output back into its counts
+                    tags_to_record.append(caption_tags.tags)
+
+                if draft:
+                    template["draft"] = True
+                    template["variant_id"] = uuid.uuid4().hex
+                    self._drafts[template["variant_id"]] = {
+                        "description": image_data["description"],
+                        "template": {key: value for key, value in template.items() if key not in ("image_url", "image_ref")},
+                    }
+                    while len(self._drafts) > settings.IMAGE_DRAFT_MAX_VARIANTS:
+                        self._drafts.popitem(last=False)
                 
                 final_templates.append(template)
         
+        if tags_to_record:
+            await asyncio.gather(*(hashtag_index.record(tags) for tags in tags_to_record))
+
         # Send progress update
         total_requested = len(descriptions.descriptions)
         total_generated = len(final_templates)
@@ -201,3 +446,60 @@ class ChatbotService:
                 "captions_with_fallback": failed_captions
             }
         }
+
+    async def finalize_template(self, variant_id: str):
+        """Re-render a draft variant at full quality, keeping its description and caption"""
+        draft = self._drafts.get(variant_id)
+        if draft is None:
+            raise Exception("Draft not found. Please generate the templates again.")
+        self._drafts.move_to_end(variant_id)
+        template = dict(draft["template"])
+        yield {
+            "category": "text",
+            "role": "assistant",
+            "message": "Rendering the final version of your template...",
+            "timestamp": datetime.now().isoformat(),
+            "loading": True
+        }
+
+        final_event = None
+        last_preview_at = 0.0
+        async for event in self.llm_service.generate_image_stream("gpt-5", self._image_messages(draft["description"])):
+            if not event.partial:
+                final_event = event
+                continue
+            now = time.monotonic()
+            if now - last_preview_at < settings.IMAGE_PREVIEW_MIN_INTERVAL:
+                continue
+            last_preview_at = now
+            yield {
+                "category": "image_preview",
+                "index": template["original_index"],
+                "image_url": f"data:image/png;base64,{event.image_b64}",
+                "timestamp": datetime.now().isoformat(),
+                "loading": True
+            }
+        if final_event is None:
+            raise Exception("No image data found in response")
+
+        template["image_url"] = f"data:image/png;base64,{final_event.image_b64}"
+        if final_event.cache_key:
+            template["image_ref"] = final_event.cache_key
+        template["draft"] = False
+        yield {
+            "template": template,
+            "category": "finalized_template",
+            "timestamp": datetime.now().isoformat(),
+            "loading": False
+        }
+
+    def _rank_tags(self, caption_tags: ImageCaptionTags, description: str) -> list[str]:
+        """Dedupe and re-rank the model's tags, filling in from the hashtag index where it proposed too few"""
+        if not settings.HASHTAG_INDEX_ENABLED:
+            return caption_tags.tags
+        try:
+            return hashtag_index.rank(caption_tags.tags, f"{description} {caption_tags.caption} {self._conversation_text()}")
+        except Exception as e:
+            # Ranking is an enhancement; never lose generated images over it
+            logger.warning("Hashtag ranking failed, using the model's tags", extra={"error": str(e)})
+            return caption_tags.tags or FALLBACK_TAGS
@@ -1,11 +1,37 @@
 from fastapi import WebSocket
-from typing import Dict
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from datetime import datetime
+import asyncio
+import json
+import time
+from app.config import settings
+from app.core.logger import get_logger
+from app.services.event_log import EPHEMERAL_CATEGORIES, IMAGE_CATEGORIES, attach_images, detach_images, event_log, with_event_id
+
+logger = get_logger(__name__)
+
+
+def serialize_event(event: dict) -> str:
+    """Wire format of an outbound WebSocket event"""
+    return json.dumps(event)
+
+
+@dataclass
+class ConnectionStats:
+    connected_at: float = field(default_factory=time.monotonic)
+    last_activity: float = field(default_factory=time.monotonic)
+    messages_in: int = 0
+    messages_out: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
 
 
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
         self.user_sessions: Dict[str, dict] = {}
+        self.connection_stats: Dict[str, ConnectionStats] = {}
 
     async def connect(self, websocket: WebSocket, user_id: str, user_data: dict):
         await websocket.accept()
@@ -14,28 +40,119 @@ class ConnectionManager:
         if user_id in self.active_connections:
             try:
                 await self.active_connections[user_id].close()
-                print(f"Closed existing connection for user ID: {user_id}")
+                logger.info("Closed existing connection", extra={"uid": user_id})
             except:
                 pass
         
         self.active_connections[user_id] = websocket
         self.user_sessions[user_id] = user_data
-        print(f"User {user_data.get('email', 'Unknown')} (UID: {user_id}) connected to chatbot")
+        self.connection_stats[user_id] = ConnectionStats()
+        logger.info("User connected to chatbot", extra={"uid": user_id})
 
     async def send_personal_message(self, message: str, user_id: str):
         if user_id in self.active_connections:
             websocket = self.active_connections[user_id]
             await websocket.send_text(message)
+            stats = self.connection_stats.get(user_id)
+            if stats is not None:
+                stats.messages_out += 1
+                stats.bytes_out += len(message)
+
+    def record_inbound(self, user_id: str, size: int, activity: bool = True):
+        """Note a message from the client; keepalive pings and pongs are not activity"""
+        stats = self.connection_stats.get(user_id)
+        if stats is not None:
+            if activity:
+                stats.last_activity = time.monotonic()
+            stats.messages_in += 1
+            stats.bytes_in += size
+
+    def lifetime_left(self, user_id: str) -> float:
+        """Seconds until the connection reaches WS_MAX_LIFETIME"""
+        stats = self.connection_stats.get(user_id)
+        if stats is None:
+            return settings.WS_MAX_LIFETIME
+        return max(0.0, stats.connected_at + settings.WS_MAX_LIFETIME - time.monotonic())
+
+    def expired(self, user_id: str, busy: bool) -> Optional[str]:
+        """Why the connection should be closed ("lifetime" or "idle"), or None"""
+        stats = self.connection_stats.get(user_id)
+        if stats is None:
+            return None
+        now = time.monotonic()
+        if now - stats.connected_at >= settings.WS_MAX_LIFETIME:
+            return "lifetime"
+        if not busy and now - stats.last_activity >= settings.WS_IDLE_TIMEOUT:
+            return "idle"
+        return None
+
+    async def heartbeat(self, user_id: str):
+        """Application-level ping that keeps proxies from closing a quiet connection; clients may answer with {"type": "pong"}"""
+        await self.send_personal_message(json.dumps({"type": "ping", "timestamp": datetime.now().isoformat()}), user_id)
 
-    def disconnect(self, user_id: str):
+    def stats(self, memory: Dict[str, int]) -> dict:
+        """Connection counts, traffic and per-connection memory for capacity planning"""
+        now = time.monotonic()
+        # uids are left out: they are enough to open a session's socket
+        connections = [
+            {
+                "age_s": round(now - stats.connected_at),
+                "idle_s": round(now - stats.last_activity),
+                "bytes_in": stats.bytes_in,
+                "bytes_out": stats.bytes_out,
+                "memory_bytes": memory.get(user_id, 0),
+            }
+            for user_id, stats in self.connection_stats.items()
+        ]
+        total_memory = sum(memory.values())
+        return {
+            "connections": len(connections),
+            "memory_bytes": total_memory,
+            "memory_bytes_per_connection": round(total_memory / len(memory)) if memory else 0,
+            "bytes_in": sum(c["bytes_in"] for c in connections),
+            "bytes_out": sum(c["bytes_out"] for c in connections),
+            "largest": sorted(connections, key=lambda c: c["memory_bytes"], reverse=True)[:10],
+        }
+
+    async def send_event(self, event: dict, user_id: str):
+        """Log an event for reconnect replay and send it if the user is connected.
+
+        Sending is best effort: work finishing while the socket is gone still
+        lands in the event log.
+        """
+        message = serialize_event(event)
+        if settings.EVENT_LOG_ENABLED and event.get("category") not in EPHEMERAL_CATEGORIES:
+            # Images already in the image cache are logged by reference instead of inline
+            logged = serialize_event(detach_images(event)) if event.get("category") in IMAGE_CATEGORIES else message
+            event_id = await event_log.append(user_id, logged)
+            if event_id is not None:
+                message = with_event_id(message, event_id)
+        try:
+            await self.send_personal_message(message, user_id)
+        except Exception as e:
+            logger.debug("Event not delivered", extra={"uid": user_id, "error": str(e)})
+
+    async def replay(self, user_id: str, last_event_id: str):
+        """Send logged events after last_event_id; clients drop ids they have already seen"""
+        events = await event_log.replay(user_id, last_event_id)
+        for event_id, message in events:
+            message = await attach_images(message)
+            await self.send_personal_message(with_event_id(message, event_id), user_id)
+        logger.info("Replayed events", extra={"uid": user_id, "count": len(events)})
+
+    def disconnect(self, user_id: str, websocket: WebSocket = None):
+        if websocket is not None and self.active_connections.get(user_id) is not websocket:
+            # The user already reconnected on a new socket; leave that one registered
+            return
         if user_id in self.active_connections:
             del self.active_connections[user_id]
+        self.connection_stats.pop(user_id, None)
         if user_id in self.user_sessions:
             user_email = self.user_sessions[user_id].get('email', 'Unknown')
             del self.user_sessions[user_id]
-            print(f"User {user_email} (UID: {user_id}) disconnected from chatbot")
+            logger.info("User disconnected from chatbot", extra={"uid": user_id})
         else:
-            print(f"User {user_id} disconnected from chatbot")
+            logger.info("User disconnected from chatbot", extra={"uid": user_id})
 
     async def broadcast(self, message: str):
         """Send message to all connected users"""
@@ -44,11 +161,28 @@ class ConnectionManager:
                 try:
                     await websocket.send_text(message)
                 except Exception as e:
-                    print(f"Failed to send broadcast to {user_id}: {e}")
+                    logger.warning("Failed to send broadcast", extra={"uid": user_id, "error": str(e)})
                     # Remove failed connection
                     try:
                         del self.active_connections[user_id]
                         if user_id in self.user_sessions:
                             del self.user_sessions[user_id]
                     except:
-                        pass
\ No newline at end of file
+                        pass
+
+    async def drain(self, code: int = 1012, reason: str = "Server restarting"):
+        """Tell every client to reconnect and close its socket, e.g. before a worker exits"""
+        reconnect_message = json.dumps({
+            "type": "reconnect",
+            "message": "Server is restarting, please reconnect.",
+            "timestamp": datetime.now().isoformat()
+        })
+
+        async def close(user_id: str, websocket: WebSocket):
+            try:
+                await websocket.send_text(reconnect_message)
+                await websocket.close(code=code, reason=reason)
+            except Exception as e:
+                logger.warning("Failed to drain connection", extra={"uid": user_id, "error": str(e)})
+
+        await asyncio.gather(*(close(user_id, websocket) for user_id, websocket in list(self.active_connections.items())))
@@ -0,0 +1,108 @@
+import asyncio
+import json
+from typing import Optional
+
+from app.config import settings
+from app.core.logger import get_logger
+from app.db.redis import redis, user_key
+from app.services.image_cache import image_cache
+from app.utils.data_uri import to_data_uri
+
+logger = get_logger(__name__)
+
+# Previews are superseded within seconds and carry full images, so they are not worth replaying
+EPHEMERAL_CATEGORIES = {"image_preview"}
+# Events carrying generated images, which are logged by reference
+IMAGE_CATEGORIES = {"final_templates", "finalized_template"}
+
+
+def _detach_image(template: dict) -> dict:
+    if "image_ref" not in template or "image_url" not in template:
+        return template
+    return {key: value for key, value in template.items() if key != "image_url"}
+
+
+async def _attach_image(template: dict) -> dict:
+    if "image_ref" not in template or "image_url" in template:
+        return template
+    attached = dict(template)
+    image_bytes = await image_cache.get(template["image_ref"])
+    if image_bytes is None:
+        # Evicted, or cached on another host's disk
+        attached["image_url"] = None
+        attached["image_expired"] = True
+    else:
+        attached["image_url"] = await asyncio.to_thread(to_data_uri, image_bytes)
+    return attached
+
+
+def detach_images(event: dict) -> dict:
+    """Copy of an event without the inline images that are already in the image cache (image_ref).
+
+    Images that were not cached stay inline, as do all images while the cache is disabled.
+    """
+    if not settings.IMAGE_CACHE_ENABLED:
+        return event
+    detached = dict(event)
+    if isinstance(event.get("templates"), list):
+        detached["templates"] = [_detach_image(template) for template in event["templates"]]
+    if isinstance(event.get("template"), dict):
+        detached["template"] = _detach_image(event["template"])
+    return detached
+
+
+async def attach_images(message: str) -> str:
+    """Serialized event with image references restored to inline images"""
+    if '"image_ref"' not in message:
+        return message
+    event = json.loads(message)
+    if isinstance(event.get("templates"), list):
+        event["templates"] = [await _attach_image(template) for template in event["templates"]]
+    if isinstance(event.get("template"), dict):
+        event["template"] = await _attach_image(event["template"])
+    return json.dumps(event)
+
+
+def with_event_id(message: str, event_id: str) -> str:
+    """Add the event id to an already serialized JSON object without re-encoding it"""
+    return f'{{"event_id": {json.dumps(event_id)}, {message[1:]}' if message != "{}" else json.dumps({"event_id": event_id})
+
+
+class EventLog:
+    """Bounded per-uid log of outbound WebSocket events in a Redis Stream.
+
+    Clients reconnect with the last event id they saw and get everything after
+    it replayed, including events emitted while they were disconnected.
+    """
+
+    def __init__(self):
+        self.redis_client = redis
+
+    def _key(self, uid: str) -> str:
+        return user_key(uid, "events")
+
+    async def append(self, uid: str, message: str) -> Optional[str]:
+        """Log a serialized event and return its id; None if logging failed"""
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.xadd(self._key(uid), {"data": message}, maxlen=settings.EVENT_LOG_MAX_LEN, approximate=True)
+                pipe.expire(self._key(uid), settings.EVENT_LOG_TTL)
+                event_id, _ = await pipe.execute()
+            return event_id
+        except Exception as e:
+            # Replay is best effort; never fail the live message because of it
+            logger.warning("Event log append failed", extra={"error": str(e)})
+            return None
+
+    async def replay(self, uid: str, last_event_id: Optional[str] = None) -> list[tuple[str, str]]:
+        """Events after last_event_id (all logged events when None), oldest first"""
+        start = f"({last_event_id}" if last_event_id else "-"
+        try:
+            entries = await self.redis_client.xrange(self._key(uid), min=start, max="+", count=settings.EVENT_LOG_MAX_LEN)
+        except Exception as e:
+            logger.warning("Event log replay failed", extra={"error": str(e), "last_event_id": last_event_id})
+            return []
+        return [(event_id, fields["data"]) for event_id, fields in entries]
+
+
+event_log = EventLog()
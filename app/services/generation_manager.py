@@ -0,0 +1,118 @@
+import asyncio
+from typing import AsyncIterator, Callable, Dict, Optional
+
+from app.core.logger import get_logger
+from app.utils.memory import payload_size
+
+logger = get_logger(__name__)
+
+_DONE = object()
+
+
+class GenerationCancelled(Exception):
+    """Raised to subscribers of a generation that was cancelled, e.g. superseded by a newer one"""
+
+
+class Generation:
+    """One running generation whose events are fanned out to every subscriber.
+
+    The generation is cancelled as soon as its last subscriber goes away, which
+    propagates into the event generator and any upstream requests it awaits.
+    """
+
+    def __init__(self, key: str, events: AsyncIterator[dict]):
+        self.key = key
+        self.history: list[dict] = []
+        self.subscribers: set[asyncio.Queue] = set()
+        self.error: Optional[BaseException] = None
+        self.task = asyncio.create_task(self._pump(events))
+
+    async def _pump(self, events: AsyncIterator[dict]):
+        try:
+            async for event in events:
+                # Kept so subscribers joining late still see the whole stream
+                self.history.append(event)
+                for queue in self.subscribers:
+                    queue.put_nowait(event)
+        except asyncio.CancelledError:
+            self.error = GenerationCancelled("Generation cancelled")
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            for queue in self.subscribers:
+                queue.put_nowait(_DONE)
+
+    async def stream(self) -> AsyncIterator[dict]:
+        queue: asyncio.Queue = asyncio.Queue()
+        for event in self.history:
+            queue.put_nowait(event)
+        if self.task.done():
+            queue.put_nowait(_DONE)
+        self.subscribers.add(queue)
+        try:
+            while True:
+                event = await queue.get()
+                if event is _DONE:
+                    break
+                yield event
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.subscribers.discard(queue)
+            if not self.subscribers and not self.task.done():
+                logger.info("Cancelling generation without subscribers", extra={"key": self.key})
+                self.task.cancel()
+
+    def cancel(self):
+        if not self.task.done():
+            self.task.cancel()
+
+
+class GenerationManager:
+    """Tracks the in-flight generations per uid.
+
+    Identical concurrent requests share one generation. Unless parallel
+    generations are asked for, starting a different one cancels the others
+    ("latest wins").
+    """
+
+    def __init__(self):
+        self._current: Dict[str, Dict[str, Generation]] = {}
+
+    def stream(self, uid: str, key: str, start: Callable[[], AsyncIterator[dict]], supersede: bool = True) -> AsyncIterator[dict]:
+        """Events of the uid's generation for key, starting it unless one is already running"""
+        generations = self._current.setdefault(uid, {})
+        generation = generations.get(key)
+        if generation is not None and not generation.task.done():
+            logger.info("Coalescing duplicate generation", extra={"key": key})
+            return generation.stream()
+        if supersede:
+            for other in generations.values():
+                if not other.task.done():
+                    logger.info("Cancelling superseded generation", extra={"key": other.key})
+                    other.cancel()
+
+        generation = Generation(key, start())
+        generations[key] = generation
+
+        def forget(_):
+            if generations.get(key) is generation:
+                del generations[key]
+            if not generations and self._current.get(uid) is generations:
+                del self._current[uid]
+
+        generation.task.add_done_callback(forget)
+        return generation.stream()
+
+    def memory_usage(self, uid: str) -> int:
+        """Approximate bytes of events buffered for the uid's in-flight generations"""
+        return sum(payload_size(generation.history) for generation in self._current.get(uid, {}).values())
+
+    def cancel(self, uid: str):
+        """Cancel all of the uid's in-flight generations"""
+        for generation in list(self._current.get(uid, {}).values()):
+            generation.cancel()
+
+
+generation_manager = GenerationManager()
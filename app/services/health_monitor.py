@@ -0,0 +1,130 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class DependencyHealth:
+    """Rolling probe statistics for one dependency, with hysteresis on its state"""
+
+    def __init__(self, name: str, critical: bool, window: int):
+        self.name = name
+        self.critical = critical
+        self.healthy: Optional[bool] = None  # Unknown until the first probe
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.consecutive_successes = 0
+        self.last_error: Optional[str] = None
+        self.last_checked: Optional[float] = None
+
+    def record(self, latency: float, error: Optional[str]):
+        self.latencies.append(latency)
+        self.outcomes.append(error is None)
+        self.last_checked = time.time()
+        if error is None:
+            self.consecutive_successes += 1
+            self.consecutive_failures = 0
+            # A single good probe is not enough to flip back to healthy
+            if self.healthy is None or self.consecutive_successes >= settings.HEALTH_RECOVERY_THRESHOLD:
+                self.healthy = True
+        else:
+            self.last_error = error
+            self.consecutive_failures += 1
+            self.consecutive_successes = 0
+            if self.healthy is None or self.consecutive_failures >= settings.HEALTH_FAILURE_THRESHOLD:
+                self.healthy = False
+
+    def to_dict(self) -> dict:
+        latencies = sorted(self.latencies)
+        def percentile(p):
+            return round(latencies[min(int(p * len(latencies)), len(latencies) - 1)] * 1000, 2) if latencies else None
+        return {
+            "status": "unknown" if self.healthy is None else ("healthy" if self.healthy else "unhealthy"),
+            "critical": self.critical,
+            "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "max": percentile(1.0)},
+            "error_rate": round(1 - sum(self.outcomes) / len(self.outcomes), 3) if self.outcomes else None,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "last_checked": self.last_checked,
+        }
+
+
+class HealthMonitor:
+    """Samples dependencies in the background so probes only read cached state"""
+
+    def __init__(self):
+        self._checks: Dict[str, Callable[[], Awaitable]] = {}
+        self.dependencies: Dict[str, DependencyHealth] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._last_cycle: Optional[float] = None
+
+    def register(self, name: str, check: Callable[[], Awaitable], critical: bool = True):
+        """Register a probe; critical dependencies gate readiness"""
+        self._checks[name] = check
+        self.dependencies[name] = DependencyHealth(name, critical, settings.HEALTH_WINDOW)
+
+    async def _probe(self, name: str):
+        start = time.perf_counter()
+        error = None
+        try:
+            await asyncio.wait_for(self._checks[name](), timeout=settings.HEALTH_CHECK_TIMEOUT)
+        except asyncio.TimeoutError:
+            error = f"timed out after {settings.HEALTH_CHECK_TIMEOUT}s"
+        except Exception as e:
+            error = str(e)
+        self.dependencies[name].record(time.perf_counter() - start, error)
+
+    async def check_all(self):
+        await asyncio.gather(*(self._probe(name) for name in self._checks))
+        self._last_cycle = time.time()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.check_all()
+            except Exception as e:
+                logger.error("Health monitor cycle failed", extra={"error": str(e)})
+            await asyncio.sleep(settings.HEALTH_CHECK_INTERVAL)
+
+    async def start(self):
+        if self._task is None:
+            # Prime the cache so readiness is known before the first probe arrives
+            await self.check_all()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def live(self) -> bool:
+        """The process is live while the monitor loop keeps cycling"""
+        if self._task is None or self._task.done():
+            return False
+        stale_after = settings.HEALTH_CHECK_INTERVAL + settings.HEALTH_CHECK_TIMEOUT * 3
+        return self._last_cycle is not None and time.time() - self._last_cycle <= stale_after
+
+    @property
+    def ready(self) -> bool:
+        return all(dep.healthy for dep in self.dependencies.values() if dep.critical)
+
+    def status(self) -> dict:
+        return {
+            "status": "healthy" if self.ready else "unhealthy",
+            "last_cycle": self._last_cycle,
+            "dependencies": {name: dep.to_dict() for name, dep in self.dependencies.items()},
+        }
+
+
+health_monitor = HealthMonitor()
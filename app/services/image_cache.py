@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from app.config import settings
+from app.db.redis import redis, tagged_key
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# Records an entry and evicts least recently used ones until the byte budget holds.
+# KEYS: lru sorted set, sizes hash, total bytes counter
+# ARGV: cache key, entry size, access time, byte budget
+_PUT_AND_EVICT_SCRIPT = """
+local old = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1])
+local total = redis.call('INCRBY', KEYS[3], tonumber(ARGV[2]) - old)
+local budget = tonumber(ARGV[4])
+local evicted = {}
+while total > budget do
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0)
+    if #oldest == 0 then break end
+    local size = tonumber(redis.call('HGET', KEYS[2], oldest[1]) or '0')
+    redis.call('ZREM', KEYS[1], oldest[1])
+    redis.call('HDEL', KEYS[2], oldest[1])
+    total = redis.call('DECRBY', KEYS[3], size)
+    table.insert(evicted, oldest[1])
+end
+if total < 0 then redis.call('SET', KEYS[3], 0) end
+return evicted
+"""
+
+
+def _normalize(text) -> str:
+    if not isinstance(text, str):
+        text = json.dumps(text, sort_keys=True)
+    return " ".join(text.split())
+
+
+class ImageCache:
+    """Disk-backed LRU cache of generated images with a Redis index.
+
+    Image bytes live under ``IMAGE_CACHE_DIR``; recency and sizes live in Redis
+    so every worker of a host sees the same hits and the same byte budget. The
+    index is scoped to the hosts that share the directory, since evictions can
+    only unlink files on the disk of the worker that runs them.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, scope: str):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.redis_client = redis
+        # One hash tag so the eviction script's keys share a cluster slot
+        tag = f"image_cache:{scope}"
+        self.lru_key = tagged_key(tag, "lru")
+        self.sizes_key = tagged_key(tag, "sizes")
+        self.bytes_key = tagged_key(tag, "bytes")
+        self._put_script = self.redis_client.register_script(_PUT_AND_EVICT_SCRIPT)
+
+    @staticmethod
+    def key_for(model: str, messages: list, tool_options: Optional[dict] = None) -> str:
+        """Hash of the model, system instructions, description and rendering options"""
+        system = [_normalize(m.get("content")) for m in messages if m.get("role") == "system"]
+        prompt = [_normalize(m.get("content")) for m in messages if m.get("role") != "system"]
+        material = {"model": model, "system": system, "prompt": prompt}
+        if tool_options:
+            # Only added when set so keys of full-quality renders stay as they were
+            material["tool"] = tool_options
+        material = json.dumps(material, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.png"
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, image_bytes: bytes):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(image_bytes)
+        os.replace(tmp_path, path)
+
+    def _unlink(self, keys: list):
+        for key in keys:
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return cached image bytes and mark the entry as recently used"""
+        try:
+            if await self.redis_client.zscore(self.lru_key, key) is None:
+                return None
+            image_bytes = await asyncio.to_thread(self._read, key)
+            if image_bytes is not None:
+                await self.redis_client.zadd(self.lru_key, {key: time.time()}, xx=True)
+            return image_bytes
+        except Exception as e:
+            logger.warning("Image cache lookup failed", extra={"error": str(e)})
+            return None
+
+    async def put(self, key: str, image_bytes: bytes):
+        """Store image bytes and evict least recently used entries over budget"""
+        try:
+            await asyncio.to_thread(self._write, key, image_bytes)
+            evicted = await self._put_script(
+                keys=[self.lru_key, self.sizes_key, self.bytes_key],
+                args=[key, len(image_bytes), time.time(), self.max_bytes],
+            )
+            if evicted:
+                await asyncio.to_thread(self._unlink, list(evicted))
+        except Exception as e:
+            logger.warning("Image cache store failed", extra={"error": str(e)})
+
+
+image_cache = ImageCache(settings.IMAGE_CACHE_DIR, settings.IMAGE_CACHE_MAX_BYTES, settings.IMAGE_CACHE_SCOPE)
@@ -0,0 +1,183 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+from app.core.logger import get_context, get_logger
+
+logger = get_logger(__name__)
+
+# Priority classes, highest first
+JOB_CLASSES = ("interactive", "structured", "image", "bulk")
+
+# Rough provider time of one call relative to a chat turn
+CALL_COSTS = {"text": 1.0, "structured": 1.0, "image": 4.0}
+_CALL_CLASSES = {"text": "interactive", "structured": "structured", "image": "image"}
+
+_plan = contextvars.ContextVar("plan", default=None)
+_job_class = contextvars.ContextVar("job_class", default=None)
+
+
+def bind_scheduling(plan: Optional[str] = None, job_class: Optional[str] = None):
+    """Bind the user's plan and/or a job class override (e.g. "bulk") to LLM calls from the current task"""
+    if plan is not None:
+        _plan.set(plan)
+    if job_class is not None:
+        _job_class.set(job_class)
+
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    """Parse "name:weight,name:weight" into a dict"""
+    weights = {}
+    for item in spec.split(","):
+        if item.strip():
+            name, _, weight = item.partition(":")
+            weights[name.strip()] = float(weight)
+    return weights
+
+
+class _Waiter:
+    __slots__ = ("job_class", "start_tag", "enqueued_at", "future")
+
+    def __init__(self, job_class: str, start_tag: float, future: asyncio.Future):
+        self.job_class = job_class
+        self.start_tag = start_tag
+        self.enqueued_at = time.monotonic()
+        self.future = future
+
+
+class LLMScheduler:
+    """Weighted fair queuing of LLM calls across uids and priority classes.
+
+    Each (job class, uid) pair is a flow weighted by class weight times plan
+    weight. Calls are admitted into a fixed number of provider slots in order of
+    their start-time fair queuing tag, so a busy flow cannot crowd out others.
+    The oldest call, once it has waited longer than LLM_SCHEDULER_MAX_WAIT, takes
+    one admission in every LLM_SCHEDULER_STARVATION_INTERVAL regardless of its
+    tag, so low-priority work is never starved while fair ordering still holds
+    under overload.
+    """
+
+    def __init__(self):
+        self.capacity = settings.LLM_SCHEDULER_CONCURRENCY
+        self.class_weights = _parse_weights(settings.LLM_SCHEDULER_CLASS_WEIGHTS)
+        self.plan_weights = _parse_weights(settings.LLM_SCHEDULER_PLAN_WEIGHTS)
+        self._active = 0
+        self._heap: list = []
+        self._fifo: deque = deque()
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._finish_tags: Dict[Tuple[str, str], float] = {}
+        self._waits: Dict[str, deque] = {job_class: deque(maxlen=1000) for job_class in JOB_CLASSES}
+        self._admitted: Dict[str, int] = {job_class: 0 for job_class in JOB_CLASSES}
+        self._starvation_admits = 0
+        self._admits_since_starved = settings.LLM_SCHEDULER_STARVATION_INTERVAL
+
+    def _weight(self, job_class: str, plan: str) -> float:
+        return max(self.class_weights.get(job_class, 1.0) * self.plan_weights.get(plan, 1.0), 1e-6)
+
+    @asynccontextmanager
+    async def slot(self, call_kind: str):
+        """Hold one provider slot for the duration of an LLM call of the given kind"""
+        job_class = _job_class.get() or _CALL_CLASSES[call_kind]
+        flow = (job_class, get_context("uid") or "anonymous")
+        weight = self._weight(job_class, _plan.get() or settings.LLM_SCHEDULER_DEFAULT_PLAN)
+
+        previous_tag = self._finish_tags.get(flow)
+        start_tag = max(self._virtual_time, self._virtual_time if previous_tag is None else previous_tag)
+        finish_tag = self._finish_tags[flow] = start_tag + CALL_COSTS[call_kind] / weight
+        waiter = _Waiter(job_class, start_tag, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._heap, (start_tag, next(self._seq), waiter))
+        self._fifo.append(waiter)
+        self._dispatch()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted just as the caller gave up: hand the slot on
+                self._release()
+            elif self._finish_tags.get(flow) == finish_tag:
+                # Never admitted and no later call of the flow builds on it: don't charge the flow
+                if previous_tag is None:
+                    self._finish_tags.pop(flow)
+                else:
+                    self._finish_tags[flow] = previous_tag
+            raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        while self._fifo and self._fifo[0].future.done():
+            self._fifo.popleft()
+        if (
+            self._fifo
+            and self._admits_since_starved >= settings.LLM_SCHEDULER_STARVATION_INTERVAL
+            and time.monotonic() - self._fifo[0].enqueued_at >= settings.LLM_SCHEDULER_MAX_WAIT
+        ):
+            self._starvation_admits += 1
+            self._admits_since_starved = 1
+            return self._fifo.popleft()
+        while self._heap:
+            _, _, waiter = heapq.heappop(self._heap)
+            if not waiter.future.done():
+                self._admits_since_starved += 1
+                return waiter
+        return None
+
+    def _dispatch(self):
+        while self._active < self.capacity:
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            self._active += 1
+            self._virtual_time = max(self._virtual_time, waiter.start_tag)
+            wait = time.monotonic() - waiter.enqueued_at
+            self._waits[waiter.job_class].append(wait)
+            self._admitted[waiter.job_class] += 1
+            if wait >= settings.LLM_SCHEDULER_SLOW_WAIT:
+                logger.info("LLM call queued", extra={"job_class": waiter.job_class, "wait_ms": round(wait * 1000)})
+            waiter.future.set_result(None)
+
+        if not self._heap and not self._fifo:
+            # Every flow is idle, so past tags no longer matter
+            self._finish_tags.clear()
+            self._virtual_time = 0.0
+
+    def _release(self):
+        self._active -= 1
+        self._dispatch()
+
+    def stats(self) -> dict:
+        """Queue depth and recent queue-wait percentiles per job class"""
+        def percentile(values, p):
+            return round(values[min(int(p * len(values)), len(values) - 1)] * 1000, 1) if values else None
+
+        queued = {job_class: 0 for job_class in JOB_CLASSES}
+        for _, _, waiter in self._heap:
+            if not waiter.future.done():
+                queued[waiter.job_class] += 1
+        classes = {}
+        for job_class in JOB_CLASSES:
+            waits = sorted(self._waits[job_class])
+            classes[job_class] = {
+                "queued": queued[job_class],
+                "admitted": self._admitted[job_class],
+                "wait_ms": {"p50": percentile(waits, 0.5), "p95": percentile(waits, 0.95), "max": percentile(waits, 1.0)},
+            }
+        return {
+            "active": self._active,
+            "capacity": self.capacity,
+            "starvation_admits": self._starvation_admits,
+            "classes": classes,
+        }
+
+
+llm_scheduler = LLMScheduler()
@@ -4,8 +4,16 @@ import base64
 import os
 import uuid
 from pathlib import Path
-from openai import AsyncOpenAI
 from pydantic import BaseModel
+from app.config import settings
+from app.models.llm_models import ImageGenerationOptions, ImageStreamEvent
+from app.services.image_cache import image_cache
+from app.services.llm_scheduler import llm_scheduler
+from app.services.metering import usage_meter
+import asyncio
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
 
 
 class LLMService(ABC):
@@ -15,10 +23,18 @@ class LLMService(ABC):
         pass
 
     @abstractmethod
-    async def generate_image(self, model: str, messages: dict) -> bytes:
+    async def generate_image(self, model: str, messages: dict, options: Optional[ImageGenerationOptions] = None) -> bytes:
         """Generate an image based on the provided prompt"""
         pass
 
+    async def generate_image_stream(self, model: str, messages: dict, options: Optional[ImageGenerationOptions] = None) -> AsyncIterator[ImageStreamEvent]:
+        """Stream preview images followed by the final image.
+
+        Backends without provider-side previews only yield the final image.
+        """
+        image_bytes = await self.generate_image(model, messages, options)
+        yield ImageStreamEvent(partial=False, image_b64=base64.b64encode(image_bytes).decode("utf-8"))
+
     @abstractmethod
     async def generate_text(self, model: str, messages: dict) -> str:
         """Generate text based on the provided prompt"""
@@ -33,31 +49,70 @@ class LLMService(ABC):
 class OpenAIService(LLMService):
     def __init__(self, api_key: str):
         self.api_key = api_key
-        self.client = AsyncOpenAI(api_key=api_key)
+        self._client = None
+
+    @property
+    def client(self):
+        """AsyncOpenAI client, created on first use so importing the SDK stays off the startup path"""
+        if self._client is None:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(api_key=self.api_key)
+        return self._client
 
     async def generate_structured_output(self, model: str, messages: dict, schema: BaseModel) -> dict:
         """Generate structured output using OpenAI's structured output parsing"""
         try:
-            
+            started_at = asyncio.get_running_loop().time()
             response = await self.client.responses.parse(
                 model=model,
                 input=messages,
                 text_format=schema,
             )
+            usage_meter.record_response(model, response, started_at)
             
             return response.output_parsed
             
         except Exception as e:
             raise Exception(f"OpenAI structured output generation failed: {str(e)}")
 
-    async def generate_image(self, model: str, messages: dict) -> bytes:
+    def _image_cache_key(self, model: str, messages: dict, options: ImageGenerationOptions) -> Optional[str]:
+        if settings.IMAGE_CACHE_ENABLED and options.use_cache:
+            return image_cache.key_for(model, messages, options.tool_options())
+        return None
+
+    @staticmethod
+    def _image_tool(options: ImageGenerationOptions, partial_images: int = 0) -> dict:
+        tool = {"type": "image_generation", **options.tool_options()}
+        if partial_images:
+            tool["partial_images"] = partial_images
+        return tool
+
+    async def _store_image(self, cache_key: Optional[str], image_bytes: bytes):
+        """Save a generated image to the image cache, or to disk when it is not cached"""
+        if cache_key:
+            # The cache keeps the file within its byte budget; a second copy would not be
+            await image_cache.put(cache_key, image_bytes)
+            return
+        file_path = await self._save_image_to_disk(image_bytes)
+        logger.debug("Image saved", extra={"path": file_path})
+
+    async def generate_image(self, model: str, messages: dict, options: Optional[ImageGenerationOptions] = None) -> bytes:
         """Generate image using OpenAI's image generation and save to disk"""
+        options = options or ImageGenerationOptions()
+        cache_key = self._image_cache_key(model, messages, options)
+        if cache_key:
+            cached_image = await image_cache.get(cache_key)
+            if cached_image is not None:
+                return cached_image
+
         try:
+            started_at = asyncio.get_running_loop().time()
             response = await self.client.responses.create(
                 model=model,
                 input=messages,
-                tools=[{"type": "image_generation"}],
+                tools=[self._image_tool(options)],
             )
+            usage_meter.record_response(model, response, started_at, images=1)
 
             # Extract image data from response
             image_data = [
@@ -71,8 +126,7 @@ class OpenAIService(LLMService):
                 image_bytes = base64.b64decode(image_base64)
                 
                 # Save image to disk
-                file_path = await self._save_image_to_disk(image_bytes)
-                print(f"Image saved to: {file_path}")
+                await self._store_image(cache_key, image_bytes)
                 
                 return image_bytes
             else:
@@ -81,13 +135,53 @@ class OpenAIService(LLMService):
         except Exception as e:
             raise Exception(f"OpenAI image generation failed: {str(e)}")
 
+    async def generate_image_stream(self, model: str, messages: dict, options: Optional[ImageGenerationOptions] = None) -> AsyncIterator[ImageStreamEvent]:
+        """Stream OpenAI partial images while the final image renders"""
+        options = options or ImageGenerationOptions()
+        cache_key = self._image_cache_key(model, messages, options)
+        if cache_key:
+            cached_image = await image_cache.get(cache_key)
+            if cached_image is not None:
+                yield ImageStreamEvent(partial=False, image_b64=base64.b64encode(cached_image).decode("utf-8"), cache_key=cache_key)
+                return
+
+        final_b64 = None
+        started_at = asyncio.get_running_loop().time()
+        try:
+            stream = await self.client.responses.create(
+                model=model,
+                input=messages,
+                tools=[self._image_tool(options, settings.IMAGE_PREVIEW_PARTIALS if options.partial_images is None else options.partial_images)],
+                stream=True,
+            )
+            # Closing the stream aborts the upstream request if the caller is cancelled
+            async with stream:
+                async for event in stream:
+                    if event.type == "response.image_generation_call.partial_image":
+                        yield ImageStreamEvent(partial=True, partial_index=event.partial_image_index, image_b64=event.partial_image_b64)
+                    elif event.type == "response.output_item.done" and getattr(event.item, "type", None) == "image_generation_call":
+                        final_b64 = event.item.result
+                    elif event.type == "response.completed":
+                        usage_meter.record_response(model, event.response, started_at, images=1)
+        except Exception as e:
+            raise Exception(f"OpenAI image generation failed: {str(e)}")
+
+        if not final_b64:
+            raise Exception("OpenAI image generation failed: No image data found in response")
+
+        await self._store_image(cache_key, base64.b64decode(final_b64))
+        # The provider already returns base64, so hand it on without re-encoding
+        yield ImageStreamEvent(partial=False, image_b64=final_b64, cache_key=cache_key)
+
     async def generate_text(self, model: str, messages: dict) -> str:
         """Generate text using OpenAI"""
         try:
+            started_at = asyncio.get_running_loop().time()
             response = await self.client.responses.create(
                 model=model,
                 input=messages
             )
+            usage_meter.record_response(model, response, started_at)
             
             return response.output_text
             
@@ -97,18 +191,26 @@ class OpenAIService(LLMService):
     async def stream_response(self, model: str, messages: dict) -> AsyncIterator[str]:
         """Stream response from OpenAI in real-time"""
         try:
+            started_at = asyncio.get_running_loop().time()
             stream = await self.client.responses.create(
                 model=model,  # Fixed typo: was 'mode'
                 input=messages,
                 stream=True,
             )
 
-            async for event in stream:
-                yield str(event)
+            async with stream:
+                async for event in stream:
+                    if event.type == "response.completed":
+                        usage_meter.record_response(model, event.response, started_at)
+                    yield str(event)
                 
         except Exception as e:
             raise Exception(f"OpenAI streaming failed: {str(e)}")
     
+    async def check_health(self):
+        """Cheap authenticated call used by the health monitor to probe the provider"""
+        await self.client.models.list()
+
     async def _save_image_to_disk(self, image_bytes: bytes) -> str:
         """Save image bytes to disk and return the file path"""
         try:
@@ -128,14 +230,48 @@ class OpenAIService(LLMService):
             return str(file_path)
             
         except Exception as e:
-            print(f"Error saving image to disk: {str(e)}")
+            logger.error("Error saving image to disk", extra={"error": str(e)})
             return None
 
 
+class ScheduledLLMService(LLMService):
+    """Routes every call of the wrapped service through the fair LLM scheduler"""
+
+    def __init__(self, service: LLMService):
+        self.service = service
+
+    def __getattr__(self, name):
+        # Anything not scheduled (e.g. check_health) goes straight to the wrapped service
+        return getattr(self.service, name)
+
+    async def generate_structured_output(self, model: str, messages: dict, schema: BaseModel) -> dict:
+        async with llm_scheduler.slot("structured"):
+            return await self.service.generate_structured_output(model, messages, schema)
+
+    async def generate_image(self, model: str, messages: dict, options: Optional[ImageGenerationOptions] = None) -> bytes:
+        async with llm_scheduler.slot("image"):
+            return await self.service.generate_image(model, messages, options)
+
+    async def generate_image_stream(self, model: str, messages: dict, options: Optional[ImageGenerationOptions] = None) -> AsyncIterator[ImageStreamEvent]:
+        async with llm_scheduler.slot("image"):
+            async for event in self.service.generate_image_stream(model, messages, options):
+                yield event
+
+    async def generate_text(self, model: str, messages: dict) -> str:
+        async with llm_scheduler.slot("text"):
+            return await self.service.generate_text(model, messages)
+
+    async def stream_response(self, model: str, messages: dict) -> AsyncIterator[str]:
+        async with llm_scheduler.slot("text"):
+            async for event in self.service.stream_response(model, messages):
+                yield event
+
+
 # Factory function to create LLM service instances
 def create_llm_service(provider: str, api_key: str) -> LLMService:
     """Factory function to create LLM service instances"""
     if provider.lower() == "openai":
-        return OpenAIService(api_key)
+        service = OpenAIService(api_key)
     else:
         raise ValueError(f"Unsupported LLM provider: {provider}")
+    return ScheduledLLMService(service) if settings.LLM_SCHEDULER_ENABLED else service
@@ -0,0 +1,176 @@
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+from app.core.logger import get_context, get_logger
+from app.db.mongo import mongodb
+from app.db.redis import redis, tagged_key, user_key
+
+logger = get_logger(__name__)
+
+METRICS = ("requests", "input_tokens", "output_tokens", "images", "wall_ms")
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%d")
+
+
+class UsageMeter:
+    """Per-uid, per-model usage counters.
+
+    Calls only touch an in-memory dict; a background task flushes the deltas to
+    Redis with one pipelined HINCRBY batch per interval, and finished days are
+    rolled up into Mongo.
+
+    Redis layout per day: a ``usage:{YYYYMMDD}`` hash of ``model|metric``
+    counters under each user's key tag, plus a set of every uid seen that day.
+    """
+
+    def __init__(self):
+        self.redis_client = redis
+        self._pending: Dict[Tuple[str, str, str], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._task: Optional[asyncio.Task] = None
+
+    def _usage_key(self, uid: str, day: str) -> str:
+        return user_key(uid, "usage", day)
+
+    def _uids_key(self, day: str) -> str:
+        return tagged_key(f"usage:{day}", "uids")
+
+    def _rollup_key(self, day: str) -> str:
+        return tagged_key(f"usage:{day}", "rolled")
+
+    def record(self, model: str, uid: Optional[str] = None, **metrics: int):
+        """Accumulate usage for the uid bound to the current task (no I/O)"""
+        uid = uid or get_context("uid") or "anonymous"
+        counters = self._pending[(uid, model, _today())]
+        counters["requests"] += 1
+        for metric, value in metrics.items():
+            if value:
+                counters[metric] += int(value)
+
+    def record_response(self, model: str, response, started_at: float, images: int = 0):
+        """Record token usage from an OpenAI response plus wall time since started_at"""
+        usage = getattr(response, "usage", None)
+        self.record(
+            model,
+            input_tokens=getattr(usage, "input_tokens", 0) or 0,
+            output_tokens=getattr(usage, "output_tokens", 0) or 0,
+            images=images,
+            wall_ms=(asyncio.get_running_loop().time() - started_at) * 1000,
+        )
+
+    async def flush(self):
+        """Write accumulated deltas to Redis in one pipeline"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+        ttl = settings.USAGE_REDIS_TTL_DAYS * 86400
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for (uid, model, day), counters in pending.items():
+                    usage_key = self._usage_key(uid, day)
+                    for metric, value in counters.items():
+                        pipe.hincrby(usage_key, f"{model}|{metric}", value)
+                    pipe.expire(usage_key, ttl)
+                    pipe.sadd(self._uids_key(day), uid)
+                    pipe.expire(self._uids_key(day), ttl)
+                await pipe.execute()
+        except Exception as e:
+            # Put the deltas back so they are retried on the next flush
+            for key, counters in pending.items():
+                for metric, value in counters.items():
+                    self._pending[key][metric] += value
+            logger.warning("Usage flush failed", extra={"error": str(e)})
+
+    async def rollup(self, day: str):
+        """Persist one day's counters to Mongo; runs once per day across all workers"""
+        if mongodb.client is None:
+            return
+        if not await self.redis_client.set(self._rollup_key(day), "1", nx=True, ex=settings.USAGE_REDIS_TTL_DAYS * 86400):
+            return
+        collection = mongodb.db.get_collection("usage_daily")
+        try:
+            async for uid in self.redis_client.sscan_iter(self._uids_key(day)):
+                models = self._parse(await self.redis_client.hgetall(self._usage_key(uid, day)))
+                await collection.update_one(
+                    {"uid": uid, "date": day},
+                    {"$set": {"uid": uid, "date": day, "models": models}},
+                    upsert=True,
+                )
+        except Exception:
+            # Let the next attempt (on any worker) redo the day; upserts make this safe
+            await self.redis_client.delete(self._rollup_key(day))
+            raise
+        logger.info("Usage rolled up", extra={"date": day})
+
+    @staticmethod
+    def _parse(fields: dict) -> Dict[str, Dict[str, int]]:
+        models: Dict[str, Dict[str, int]] = defaultdict(dict)
+        for field, value in fields.items():
+            model, _, metric = field.rpartition("|")
+            models[model][metric] = int(value)
+        return dict(models)
+
+    async def get_usage(self, uid: str, start: date, end: date) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """Usage per day and model for a uid, from Redis for recent days and Mongo for older ones"""
+        usage = {}
+        redis_horizon = datetime.now(timezone.utc).date() - timedelta(days=settings.USAGE_REDIS_TTL_DAYS - 1)
+        older_days = []
+        day = start
+        while day <= end:
+            key = day.strftime("%Y%m%d")
+            if day >= redis_horizon:
+                fields = await self.redis_client.hgetall(self._usage_key(uid, key))
+                if fields:
+                    usage[key] = self._parse(fields)
+            else:
+                older_days.append(key)
+            day += timedelta(days=1)
+        if older_days and mongodb.client is not None:
+            collection = mongodb.db.get_collection("usage_daily")
+            async for doc in collection.find({"uid": uid, "date": {"$in": older_days}}):
+                usage[doc["date"]] = doc["models"]
+        return usage
+
+    async def get_totals(self, uid: str, day: Optional[str] = None) -> Dict[str, int]:
+        """Totals across models for one day; intended for quotas and rate limiting"""
+        models = self._parse(await self.redis_client.hgetall(self._usage_key(uid, day or _today())))
+        totals = {metric: 0 for metric in METRICS}
+        for counters in models.values():
+            for metric, value in counters.items():
+                totals[metric] = totals.get(metric, 0) + value
+        return totals
+
+    async def _run(self):
+        last_rollup_check = float("-inf")
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(settings.USAGE_FLUSH_INTERVAL_MS / 1000)
+            await self.flush()
+            if loop.time() - last_rollup_check >= 3600:
+                last_rollup_check = loop.time()
+                yesterday = (datetime.now(timezone.utc) - timedelta(days=1)).strftime("%Y%m%d")
+                try:
+                    await self.rollup(yesterday)
+                except Exception as e:
+                    logger.warning("Usage rollup failed", extra={"date": yesterday, "error": str(e)})
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+usage_meter = UsageMeter()
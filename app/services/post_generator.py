@@ -1,14 +1,32 @@
-from app.services.llm_service import OpenAIService
+from app.services.llm_service import create_llm_service
+from app.services.chatbot import ChatbotService
 from app.config import settings
-from app.prompts.prompts import Prompts
+from app.db.database import ContentFetcher
+from app.schemas.bulk import ProductBrief
+
 
 class PostGenerator:
+    """Runs the description, image and caption pipeline for a product brief without a chat"""
+
     def __init__(self):
-        self.llm_service = OpenAIService(api_key=settings.OPENAI_API_KEY)
+        self.llm_service = create_llm_service("openai", settings.OPENAI_API_KEY)
+        self.content_fetcher = ContentFetcher()
+
+    async def generate_posts(self, brief: ProductBrief) -> dict:
+        """Generate advertisement templates for a brief and return the final templates event"""
+        if brief.template_id:
+            template = await self.content_fetcher.fetch_template(brief.template_id)
+        else:
+            template = {"description": brief.platform}
 
-    
+        chatbot = ChatbotService(llm_service=self.llm_service)
+        chatbot.conversation_history.append({"role": "user", "content": brief.to_message()})
 
-    async def post_description(self, transcript) -> dict:
-        # Retrieve user data from Redis using UID
-        system_content = Prompts.AD_TEXT_GENERATION_PROMPT.value.format(product_description=transcript)
-        expanded_query = await self.llm_service.expand_query(transcript)
\ No newline at end of file
+        final = None
+        # Nobody watches bulk renders, so do not pay for provider previews
+        async for response in chatbot.generate_templates(template, previews=False):
+            if response.get("category") == "final_templates":
+                final = response
+        if final is None:
+            raise Exception("Generation finished without templates")
+        return final
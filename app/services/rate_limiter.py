@@ -0,0 +1,136 @@
+import time
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+from app.config import settings
+from app.db.redis import redis, user_key
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# Atomic token bucket using the Redis server clock, so all workers agree on refill.
+# KEYS: bucket hash
+# ARGV: capacity, refill rate (tokens/s), cost, tokens already granted locally
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local debt = tonumber(ARGV[4])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate) - debt
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, bucket: str, retry_after: float):
+        self.bucket = bucket
+        self.retry_after = retry_after
+        super().__init__(f"Rate limit exceeded for {bucket}, retry after {retry_after:.1f}s")
+
+    def to_event(self) -> dict:
+        """Structured error event sent over the WebSocket"""
+        return {
+            "type": "error",
+            "code": "rate_limited",
+            "bucket": self.bucket,
+            "retry_after": round(self.retry_after, 2),
+            "message": f"Too many requests. Please retry in {max(1, round(self.retry_after))} seconds.",
+        }
+
+
+def _parse_limit(limit: str) -> Tuple[float, float]:
+    """Parse "<capacity>/<seconds>" into (capacity, tokens per second)"""
+    capacity, period = limit.split("/")
+    return float(capacity), float(capacity) / float(period)
+
+
+@dataclass
+class _LocalBucket:
+    tokens: float  # Tokens Redis reported at the last sync
+    synced_at: float
+    pending: int = 0  # Tokens granted locally since the last sync
+
+
+class RateLimiter:
+    """Distributed per-identity token buckets with a local pre-check.
+
+    Identities whose last known bucket is comfortably full are admitted locally;
+    the tokens they used are charged to Redis on the next round trip.
+    """
+
+    def __init__(self):
+        self.redis_client = redis
+        self.buckets: Dict[str, Tuple[float, float]] = {
+            "chat": _parse_limit(settings.RATE_LIMIT_CHAT),
+            "generation": _parse_limit(settings.RATE_LIMIT_GENERATION),
+            "login": _parse_limit(settings.RATE_LIMIT_LOGIN),
+        }
+        self._local: Dict[Tuple[str, str], _LocalBucket] = {}
+        self._script = self.redis_client.register_script(_TOKEN_BUCKET_SCRIPT)
+
+    def _key(self, bucket: str, identity: str) -> str:
+        return user_key(identity, "ratelimit", bucket)
+
+    def _local_check(self, bucket: str, identity: str, cost: int) -> bool:
+        entry = self._local.get((bucket, identity))
+        if entry is None:
+            return False
+        now = time.monotonic()
+        if now - entry.synced_at > settings.RATE_LIMIT_LOCAL_TTL:
+            return False
+        capacity, rate = self.buckets[bucket]
+        estimate = min(capacity, entry.tokens + (now - entry.synced_at) * rate) - entry.pending
+        if estimate - cost < capacity * settings.RATE_LIMIT_LOCAL_HEADROOM:
+            return False
+        entry.pending += cost
+        return True
+
+    def _prune_local(self):
+        now = time.monotonic()
+        stale = [k for k, v in self._local.items() if now - v.synced_at > settings.RATE_LIMIT_LOCAL_TTL]
+        for k in stale:
+            del self._local[k]
+
+    async def check(self, bucket: str, identity: str, cost: int = 1):
+        """Consume tokens or raise RateLimitExceeded; fails open if Redis is unavailable"""
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        if self._local_check(bucket, identity, cost):
+            return
+
+        capacity, rate = self.buckets[bucket]
+        entry = self._local.get((bucket, identity))
+        debt = entry.pending if entry else 0
+        try:
+            allowed, tokens, retry_after = await self._script(
+                keys=[self._key(bucket, identity)],
+                args=[capacity, rate, cost, debt],
+            )
+        except Exception as e:
+            logger.warning("Rate limiter unavailable, allowing request", extra={"error": str(e)})
+            return
+
+        if len(self._local) > 10000:
+            self._prune_local()
+        self._local[(bucket, identity)] = _LocalBucket(float(tokens), time.monotonic())
+        if not int(allowed):
+            raise RateLimitExceeded(bucket, float(retry_after))
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import multiprocessing
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+
+from app.config import settings
+from app.core.logger import get_logger
+from app.db.redis import redis, tagged_key, user_key
+from app.utils.data_uri import to_data_uri
+from app.utils.image_processing import downscale_image
+
+logger = get_logger(__name__)
+
+_WRITE_BUFFER_BYTES = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class InvalidImage(Exception):
+    pass
+
+
+class UploadStore:
+    """Product photos uploaded by users, downscaled for model input.
+
+    Uploads are streamed to a temporary file while being hashed, so whole files
+    are never held in memory. Identical content is stored once; the processed
+    JPEG is keyed by the hash of the original bytes and each user only sees the
+    ids they uploaded themselves.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.redis_client = redis
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        """Worker processes for decoding and re-encoding, created on first upload"""
+        if self._pool is None:
+            # Spawned rather than forked: the server process runs threads (logging, loop monitor)
+            self._pool = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_UPLOAD_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _path(self, upload_id: str) -> Path:
+        return self.directory / upload_id[:2] / f"{upload_id}.jpg"
+
+    def _meta_key(self, upload_id: str) -> str:
+        return tagged_key(f"upload:{upload_id}", "meta")
+
+    def _owned_key(self, uid: str) -> str:
+        return user_key(uid, "uploads")
+
+    async def _receive(self, chunks: AsyncIterator[bytes], tmp_path: Path) -> str:
+        """Write the streamed body to tmp_path and return the sha256 of its content"""
+        digest = hashlib.sha256()
+        size = 0
+        buffer = bytearray()
+        with open(tmp_path, "wb") as f:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > settings.IMAGE_UPLOAD_MAX_BYTES:
+                    raise UploadTooLarge(f"Upload exceeds {settings.IMAGE_UPLOAD_MAX_BYTES} bytes")
+                digest.update(chunk)
+                buffer += chunk
+                if len(buffer) >= _WRITE_BUFFER_BYTES:
+                    await asyncio.to_thread(f.write, bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await asyncio.to_thread(f.write, bytes(buffer))
+        if size == 0:
+            raise InvalidImage("Upload is empty")
+        return digest.hexdigest()
+
+    async def save(self, uid: str, chunks: AsyncIterator[bytes]) -> Dict:
+        """Store a streamed image upload for uid and return its metadata"""
+        tmp_dir = self.directory / "tmp"
+        await asyncio.to_thread(tmp_dir.mkdir, parents=True, exist_ok=True)
+        tmp_path = tmp_dir / f"{uuid.uuid4().hex}.upload"
+        try:
+            upload_id = (await self._receive(chunks, tmp_path))[:32]
+            meta = await self.redis_client.hgetall(self._meta_key(upload_id))
+            deduplicated = bool(meta) and await asyncio.to_thread(self._path(upload_id).exists)
+            if not deduplicated:
+                target = self._path(upload_id)
+                await asyncio.to_thread(target.parent.mkdir, parents=True, exist_ok=True)
+                try:
+                    width, height, size = await asyncio.get_running_loop().run_in_executor(
+                        self.pool, downscale_image, str(tmp_path), str(target),
+                        settings.IMAGE_UPLOAD_MAX_SIDE, settings.IMAGE_UPLOAD_QUALITY,
+                    )
+                except BrokenProcessPool:
+                    # A worker died (e.g. out of memory); start a fresh pool for the next upload
+                    self._pool = None
+                    raise
+                except Exception as e:
+                    logger.info("Rejected upload", extra={"error": str(e)})
+                    raise InvalidImage("Could not read the uploaded file as an image")
+                meta = {"width": width, "height": height, "bytes": size}
+                await self.redis_client.hset(self._meta_key(upload_id), mapping=meta)
+            await self.redis_client.sadd(self._owned_key(uid), upload_id)
+        finally:
+            await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+
+        logger.info("Image uploaded", extra={"upload_id": upload_id, "deduplicated": deduplicated})
+        return {
+            "upload_id": upload_id,
+            "width": int(meta["width"]),
+            "height": int(meta["height"]),
+            "bytes": int(meta["bytes"]),
+            "deduplicated": deduplicated,
+        }
+
+    async def owns(self, uid: str, upload_id: str) -> bool:
+        return bool(await self.redis_client.sismember(self._owned_key(uid), upload_id))
+
+    async def data_uri(self, upload_id: str) -> str:
+        """The processed image as a data URI for model input"""
+        try:
+            image_bytes = await asyncio.to_thread(self._path(upload_id).read_bytes)
+        except FileNotFoundError:
+            raise Exception(f"Uploaded image {upload_id} not found")
+        return to_data_uri(image_bytes, "image/jpeg")
+
+
+upload_store = UploadStore(settings.IMAGE_UPLOAD_DIR)
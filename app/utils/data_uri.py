@@ -0,0 +1,18 @@
+"""
+Data URIs for images sent to clients and models
+"""
+
+import base64
+
+PNG_PREFIX = "data:image/png;base64,"
+
+
+def to_data_uri(image_bytes: bytes, media_type: str = "image/png") -> str:
+    return f"data:{media_type};base64,{base64.b64encode(image_bytes).decode('utf-8')}"
+
+
+def png_bytes(data_uri: str) -> bytes:
+    """Decode a PNG data URI as produced for generated images"""
+    if not data_uri.startswith(PNG_PREFIX):
+        raise ValueError("Not a PNG data URI")
+    return base64.b64decode(data_uri[len(PNG_PREFIX):])
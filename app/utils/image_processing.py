@@ -0,0 +1,25 @@
+"""
+Image processing run in worker processes
+
+Kept free of app imports so spawned workers start quickly.
+"""
+
+import os
+
+
+def downscale_image(source_path: str, target_path: str, max_side: int, quality: int) -> tuple[int, int, int]:
+    """Downscale an image to fit max_side and re-encode it as JPEG; returns (width, height, bytes)"""
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as image:
+        # Decode straight at a reduced scale where the format allows it (JPEG draft mode)
+        image.draft("RGB", (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+        tmp_path = f"{target_path}.{os.getpid()}.tmp"
+        image.save(tmp_path, "JPEG", quality=quality, optimize=True)
+        os.replace(tmp_path, target_path)
+        return image.width, image.height, os.path.getsize(target_path)
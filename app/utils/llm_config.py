@@ -31,6 +31,13 @@ class LLMConfig:
                 provider=ProviderType.OPENAI,
                 api_key=self.openai_api_key or ""
             ),
+            "gpt-5-mini": LLMModel(
+                name="gpt-5-mini",
+                description="Cheaper GPT-5 model used to render draft images",
+                model_id="gpt-5-mini",
+                provider=ProviderType.OPENAI,
+                api_key=self.openai_api_key or ""
+            ),
             "gemini-pro": LLMModel(
                 name="gemini-pro",
                 description="Google Gemini Pro model",
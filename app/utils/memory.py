@@ -0,0 +1,16 @@
+"""
+Rough memory accounting for conversation state and buffered payloads
+"""
+
+
+def payload_size(value) -> int:
+    """Approximate bytes held by a JSON-like value, dominated by its strings (e.g. base64 images)"""
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(str(key)) + payload_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sum(payload_size(item) for item in value)
+    if hasattr(value, "model_dump"):
+        return payload_size(value.model_dump())
+    return 8
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the CPU hot spots of one generation
+
+Every case calls the application code itself. CPU-only cases cover serializing
+the final_templates event, stripping cached images for the event log, event id
+insertion, data URI encoding and decoding, ObjectId conversion in
+ContentFetcher and building the provider history with uploaded photos in
+ChatbotService. Cases prefixed io_ run the same paths end to end with disk and
+Redis I/O (upload data URIs, storing bulk result images, sending and logging
+final_templates), next to SessionManager/ConnectionManager operations. Redis is a
+local stand-in (fakeredis, from requirements-dev.txt, unless --redis-url is
+given). Payloads are sized like real gpt-image output.
+
+Each run is saved as JSON under .benchmarks/, named after the current commit,
+so two commits can be compared. With --compare the run exits with status 1
+when any benchmark's median is slower than the baseline by more than
+--threshold.
+
+Usage: python -m benchmarks.hotpaths [--rounds 15] [--filter base64] [--redis-url redis://localhost:6379/15]
+                                     [--compare <commit or results file>] [--threshold 0.15]
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+RESULTS_DIR = PROJECT_ROOT / ".benchmarks"
+
+# A 1024x1024 PNG from the image model is 1.5-2.5 MB; random bytes keep it incompressible
+IMAGE_BYTES = os.urandom(1_600_000)
+IMAGE_B64 = base64.b64encode(IMAGE_BYTES).decode("utf-8")
+TEMPLATES_PER_GENERATION = 3
+HISTORY_TURNS = 20
+FETCHED_TEMPLATES = 20
+
+
+class FakeWebSocket:
+    """Accepts everything and discards sent frames"""
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        pass
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        pass
+
+
+def final_templates_event() -> dict:
+    templates = [
+        {
+            "title": f"Advertisement Template {i + 1}",
+            "description": "A bright flat-lay of the product on a pastel background with soft shadows. " * 4,
+            "image_url": f"data:image/png;base64,{IMAGE_B64}",
+            "image_ref": f"{i:064x}",  # Image cache key, as for cached generations
+            "caption": "Fresh roast, bold mornings - your new daily ritual starts here",
+            "tags": ["coffee", "morning", "ritual", "freshroast", "dailybrew"],
+            "template_number": i + 1,
+            "original_index": i,
+        }
+        for i in range(TEMPLATES_PER_GENERATION)
+    ]
+    return {
+        "templates": templates,
+        "category": "final_templates",
+        "timestamp": datetime.now().isoformat(),
+        "loading": False,
+        "stats": {"total_requested": 3, "total_generated": 3, "images_successful": 3,
+                  "captions_successful": 3, "captions_with_fallback": 0},
+    }
+
+
+def conversation_history() -> list[dict]:
+    history = []
+    for i in range(HISTORY_TURNS):
+        history.append({"role": "user", "content": f"Turn {i}: our cold brew is roasted in small batches and sold online. " * 3})
+        history.append({"role": "assistant", "content": f"Got it. Who is the target audience for turn {i}? " * 3})
+    return history
+
+
+def mongo_templates() -> list[dict]:
+    from bson import ObjectId
+
+    return [
+        {
+            "_id": ObjectId(),
+            "id": f"template-{i}",
+            "name": f"Template {i}",
+            "category": "general",
+            "instructions": "Compose a clean product hero shot with bold headline space. " * 10,
+        }
+        for i in range(FETCHED_TEMPLATES)
+    ]
+
+
+def sync_benchmarks() -> dict:
+    from app.db.database import serialize_templates
+    from app.services.connection_manager import serialize_event
+    from app.services.event_log import detach_images, with_event_id
+    from app.utils.data_uri import png_bytes, to_data_uri
+
+    event = final_templates_event()
+    message = serialize_event(event)
+    image_url = event["templates"][0]["image_url"]
+
+    def serialize_ids():
+        # Fresh documents each call, as ContentFetcher gets them from the driver
+        serialize_templates(mongo_templates())
+
+    return {
+        # CPU only: what send_event, the event log and bulk results do per generation, without I/O
+        "serialize_final_templates": lambda: serialize_event(event),
+        "event_log_detach_images": lambda: serialize_event(detach_images(event)),
+        "event_id_insert": lambda: with_event_id(message, "1700000000000-0"),
+        "data_uri_decode_image": lambda: png_bytes(image_url),
+        "data_uri_encode_image": lambda: to_data_uri(IMAGE_BYTES),
+        "content_fetcher_id_conversion": serialize_ids,
+        # Document construction alone, to subtract from content_fetcher_id_conversion
+        "mongo_templates_baseline": mongo_templates,
+    }
+
+
+def create_redis_stand_in(redis_url: str = None):
+    if redis_url:
+        from redis.asyncio import Redis
+        return Redis.from_url(redis_url, decode_responses=True)
+    try:
+        import fakeredis
+    except ImportError:
+        raise SystemExit("fakeredis is not installed; pip install fakeredis or pass --redis-url")
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+def async_benchmarks(redis_client, work_dir: Path) -> dict:
+    from app.db.redis import ChatSessionManager, SessionManager
+    from app.services import image_cache as image_cache_module
+    from app.services.bulk_jobs import BulkJobManager
+    from app.services.chatbot import ChatbotService
+    from app.services.connection_manager import ConnectionManager
+    from app.services.event_log import event_log
+    from app.services.upload_store import UploadStore
+
+    # Point the module singletons used by event logging at the stand-in and a scratch directory
+    event_log.redis_client = redis_client
+    image_cache = image_cache_module.image_cache
+    image_cache.redis_client = redis_client
+    image_cache.directory = work_dir / "cache"
+    image_cache._put_script = redis_client.register_script(image_cache_module._PUT_AND_EVICT_SCRIPT)
+
+    chatbot = ChatbotService("system prompt")
+    chatbot.conversation_history = conversation_history() + [{"role": "user", "content": [
+        {"type": "input_text", "text": "Here is the product"},
+        {"type": "input_image", "upload_id": "bench-upload"},
+    ]}]
+    # Resolved once per conversation; the benchmark covers rebuilding the history on each turn
+    chatbot._upload_urls["bench-upload"] = f"data:image/jpeg;base64,{IMAGE_B64}"
+
+    upload_store = UploadStore(str(work_dir / "uploads"))
+    upload_path = upload_store._path("bench-upload")
+    upload_path.parent.mkdir(parents=True)
+    upload_path.write_bytes(IMAGE_BYTES)
+
+    bulk_job_manager = BulkJobManager(str(work_dir / "bulk"))
+    event = final_templates_event()
+
+    session_manager = SessionManager()
+    session_manager.redis_client = redis_client
+    chat_session_manager = ChatSessionManager()
+    chat_session_manager.redis_client = redis_client
+    manager = ConnectionManager()
+    user_data = {"name": "Bench User", "email": "bench@example.com", "uid": "bench-uid"}
+    token = "firebase-token-" + "x" * 900
+    message = json.dumps({"category": "text", "role": "assistant", "message": "Hello " * 50})
+
+    async def connection_cycle():
+        await manager.connect(FakeWebSocket(), user_data["uid"], user_data)
+        await manager.send_personal_message(message, user_data["uid"])
+        manager.disconnect(user_data["uid"])
+
+    async def send_final_templates():
+        await manager.connect(FakeWebSocket(), "bench-events", user_data)
+        await manager.send_event(event, "bench-events")
+
+    return {
+        "chatbot_history_with_upload": chatbot._history,
+        # End to end with disk and Redis stand-in I/O; expect these to be noisy
+        "io_upload_data_uri": lambda: upload_store.data_uri("bench-upload"),
+        "io_bulk_store_result_images": lambda: bulk_job_manager._store_images("0" * 32, 0, event["templates"]),
+        "io_connection_send_final_templates": send_final_templates,
+        "session_create": lambda: session_manager.create_session(token, user_data),
+        "session_get": lambda: session_manager.get_session(token),
+        "session_get_by_uid": lambda: session_manager.get_data_by_uid(user_data["uid"]),
+        "session_extend": lambda: session_manager.extend_session(token),
+        "chat_session_store": lambda: chat_session_manager.store_chatbot_instance(user_data["uid"], "instance"),
+        "connection_connect_send_disconnect": connection_cycle,
+    }
+
+
+def time_sync(func, rounds: int, iterations: int) -> list[float]:
+    func()  # Warm up
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        timings.append((time.perf_counter() - start) / iterations)
+    return timings
+
+
+async def time_async(func, rounds: int, iterations: int) -> list[float]:
+    await func()
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await func()
+        timings.append((time.perf_counter() - start) / iterations)
+    return timings
+
+
+def calibrate(elapsed: float, target: float = 0.05) -> int:
+    """Iterations per round so each round takes roughly target seconds"""
+    return max(1, int(target / max(elapsed, 1e-9)))
+
+
+def summarize(timings: list[float], iterations: int) -> dict:
+    return {
+        "median_us": statistics.median(timings) * 1e6,
+        "min_us": min(timings) * 1e6,
+        "stdev_us": (statistics.stdev(timings) if len(timings) > 1 else 0.0) * 1e6,
+        "rounds": len(timings),
+        "iterations": iterations,
+    }
+
+
+async def run(args) -> dict:
+    results = {}
+    for name, func in sync_benchmarks().items():
+        if args.filter and args.filter not in name:
+            continue
+        func()  # The first call pays for imports and caches, so calibrate on a warm one
+        start = time.perf_counter()
+        func()
+        iterations = calibrate(time.perf_counter() - start)
+        results[name] = summarize(time_sync(func, args.rounds, iterations), iterations)
+
+    redis_client = create_redis_stand_in(args.redis_url)
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            for name, func in async_benchmarks(redis_client, Path(work_dir)).items():
+                if args.filter and args.filter not in name:
+                    continue
+                await func()
+                start = time.perf_counter()
+                await func()
+                iterations = calibrate(time.perf_counter() - start)
+                results[name] = summarize(await time_async(func, args.rounds, iterations), iterations)
+    finally:
+        await redis_client.aclose()
+    return results
+
+
+def git_commit() -> str:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True)
+        commit = result.stdout.strip() or "unknown"
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD"], cwd=PROJECT_ROOT).returncode != 0
+        return f"{commit}-dirty" if dirty else commit
+    except OSError:
+        return "unknown"
+
+
+def load_baseline(ref: str) -> dict:
+    path = Path(ref)
+    if not path.exists():
+        path = RESULTS_DIR / f"{ref}.json"
+    if not path.exists():
+        raise SystemExit(f"No stored results for {ref}; run the suite on that commit first")
+    return json.loads(path.read_text())
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> bool:
+    ok = True
+    print(f"\nCompared with {baseline['commit']} (threshold +{threshold:.0%}):")
+    for name, stats in current["benchmarks"].items():
+        before = baseline["benchmarks"].get(name)
+        if before is None:
+            print(f"  {name:<36} new")
+            continue
+        change = stats["median_us"] / before["median_us"] - 1
+        regressed = change > threshold
+        ok = ok and not regressed
+        print(f"  {name:<36} {before['median_us']:>12.2f} -> {stats['median_us']:>12.2f} us "
+              f"({change:+.1%}){' REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this string")
+    parser.add_argument("--redis-url", help="benchmark against this Redis instead of fakeredis; keys are not cleaned up")
+    parser.add_argument("--compare", help="commit or results file to compare against")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("BENCHMARK_REGRESSION_THRESHOLD", 0.15)))
+    parser.add_argument("--no-save", action="store_true", help="do not store the results")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(PROJECT_ROOT))
+    benchmarks = asyncio.run(run(args))
+
+    current = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": benchmarks,
+    }
+    for name, stats in benchmarks.items():
+        print(f"{name:<36} median {stats['median_us']:>12.2f} us  min {stats['min_us']:>12.2f} us  "
+              f"(x{stats['iterations']}, {stats['rounds']} rounds)")
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        path = RESULTS_DIR / f"{current['commit']}.json"
+        path.write_text(json.dumps(current, indent=2))
+        print(f"\nSaved results to {path.relative_to(PROJECT_ROOT)}")
+
+    ok = compare(load_baseline(args.compare), current, args.threshold) if args.compare else True
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the API
+
+Measures the median wall time of importing ``app.main`` in fresh interpreters
+and, with ``--lifespan``, of running the application startup against live
+MongoDB and Redis. Exits with status 1 when a budget is exceeded so it can
+gate CI builds.
+
+Usage: python -m benchmarks.startup [--runs 5] [--import-budget 1.5] [--lifespan --startup-budget 3.0]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import app.main
+print(f"STARTUP_SECONDS={time.perf_counter() - start}")
+"""
+
+LIFESPAN_SNIPPET = """
+import asyncio, time
+from app.main import app, lifespan
+
+async def run():
+    start = time.perf_counter()
+    async with lifespan(app):
+        print(f"STARTUP_SECONDS={time.perf_counter() - start}")
+
+asyncio.run(run())
+"""
+
+
+def measure(snippet: str, runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", snippet],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Benchmark run failed:\n{result.stderr}")
+        # The app logs to stdout as well, so pick out the marked timing line
+        marked = [line for line in result.stdout.splitlines() if line.startswith("STARTUP_SECONDS=")]
+        timings.append(float(marked[-1].split("=", 1)[1]))
+    return timings
+
+
+def report(label: str, timings: list[float], budget: float) -> bool:
+    median = statistics.median(timings)
+    within_budget = median <= budget
+    status = "OK" if within_budget else "OVER BUDGET"
+    print(f"{label}: median {median * 1000:.1f} ms, max {max(timings) * 1000:.1f} ms "
+          f"(budget {budget * 1000:.0f} ms) {status}")
+    return within_budget
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget", type=float, default=float(os.getenv("STARTUP_IMPORT_BUDGET_SECONDS", 1.5)))
+    parser.add_argument("--lifespan", action="store_true", help="also time startup against live MongoDB and Redis")
+    parser.add_argument("--startup-budget", type=float, default=float(os.getenv("STARTUP_LIFESPAN_BUDGET_SECONDS", 3.0)))
+    args = parser.parse_args()
+
+    ok = report("import app.main", measure(IMPORT_SNIPPET, args.runs), args.import_budget)
+    if args.lifespan:
+        ok = report("lifespan startup", measure(LIFESPAN_SNIPPET, args.runs), args.startup_budget) and ok
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Production launcher for the Media Ad Generator API
+
+Pre-forks WORKERS uvicorn processes that share one listening socket (or bind
+their own with SO_REUSEPORT), runs them on uvloop/httptools, recycles workers
+whose memory grows past WORKER_MAX_MEMORY_MB and drains WebSockets on SIGTERM.
+Configuration comes from the same Settings as run.py; reload is never enabled.
+"""
+
+import asyncio
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional
+
+import uvicorn
+from app.config import settings
+
+
+def _select(module: str, preferred: str, fallback: str) -> str:
+    """Use the fast implementation when it is installed, otherwise say so and fall back"""
+    try:
+        __import__(module)
+        return preferred
+    except ImportError:
+        print(f"⚠️ {module} is not installed, falling back to {fallback}")
+        return fallback
+
+
+def _bind_socket(reuse_port: bool) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in settings.HOST else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((settings.HOST, settings.PORT))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    """Resident set size of a process from /proc, or None where it is unavailable"""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn server that asks WebSocket clients to reconnect before shutting down"""
+
+    async def serve(self, sockets=None):
+        self._loop = asyncio.get_running_loop()
+        await super().serve(sockets=sockets)
+
+    def handle_exit(self, sig, frame):
+        if not self.should_exit and getattr(self, "_loop", None) is not None:
+            from app.api.v1.endpoints.ws import manager
+            self._loop.call_soon_threadsafe(lambda: self._loop.create_task(manager.drain()))
+        super().handle_exit(sig, frame)
+
+
+def run_worker(sock: Optional[socket.socket]):
+    """Worker entry point; the app is imported here so no connections are shared across forks"""
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+    if sock is None:
+        sock = _bind_socket(reuse_port=True)
+
+    config = uvicorn.Config(
+        "app.main:app",
+        loop=_select("uvloop", "uvloop", "asyncio"),
+        http=_select("httptools", "httptools", "h11"),
+        lifespan="on",
+        reload=False,
+        timeout_graceful_shutdown=settings.GRACEFUL_SHUTDOWN_TIMEOUT,
+        proxy_headers=True,
+        forwarded_allow_ips=settings.FORWARDED_ALLOW_IPS,
+        ws_ping_interval=settings.WS_PING_INTERVAL,
+        ws_ping_timeout=settings.WS_PING_TIMEOUT,
+        log_level="info" if settings.DEBUG else "warning",
+    )
+    DrainingServer(config).run(sockets=[sock])
+
+
+class Supervisor:
+    """Pre-fork master: spawns, monitors, recycles and stops worker processes"""
+
+    def __init__(self):
+        self.workers: Dict[int, float] = {}  # pid -> start time
+        self.retiring: Dict[int, float] = {}  # pid -> time SIGTERM was sent
+        self.stopping = False
+        self.sock = None if settings.REUSE_PORT else _bind_socket(reuse_port=False)
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                run_worker(self.sock)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        self.workers[pid] = time.monotonic()
+        print(f"👷 Started worker {pid}")
+
+    def retire(self, pid: int):
+        """Ask a worker to finish gracefully; it is killed if it outlives the drain timeout"""
+        if pid in self.retiring:
+            return
+        self.retiring[pid] = time.monotonic()
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            expected = pid in self.retiring
+            started_at = self.workers.pop(pid, time.monotonic())
+            self.retiring.pop(pid, None)
+            if not expected and not self.stopping:
+                print(f"⚠️ Worker {pid} exited unexpectedly (status {status}), restarting")
+                if time.monotonic() - started_at < 5:
+                    # Back off when workers die during startup, e.g. while a dependency is down
+                    time.sleep(1)
+                self.spawn()
+
+    def check_workers(self, check_memory: bool):
+        now = time.monotonic()
+        max_bytes = settings.WORKER_MAX_MEMORY_MB * 1024 * 1024
+        for pid in list(self.workers):
+            if pid in self.retiring:
+                if now - self.retiring[pid] > settings.GRACEFUL_SHUTDOWN_TIMEOUT + 5:
+                    print(f"⚠️ Worker {pid} did not drain in time, killing")
+                    try:
+                        os.kill(pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+                continue
+            if check_memory and max_bytes and not self.stopping:
+                rss = _rss_bytes(pid)
+                if rss is not None and rss > max_bytes:
+                    print(f"♻️ Worker {pid} uses {rss // (1024 * 1024)} MB, recycling")
+                    # Start the replacement first so capacity never drops
+                    self.spawn()
+                    self.retire(pid)
+
+    def stop(self, sig, frame):
+        if not self.stopping:
+            print("🛑 Shutting down workers...")
+            self.stopping = True
+            for pid in list(self.workers):
+                self.retire(pid)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(settings.WORKERS):
+            self.spawn()
+
+        last_memory_check = time.monotonic()
+        while self.workers:
+            self.reap()
+            check_memory = time.monotonic() - last_memory_check >= settings.WORKER_MEMORY_CHECK_INTERVAL
+            if check_memory:
+                last_memory_check = time.monotonic()
+            self.check_workers(check_memory)
+            time.sleep(0.2)
+        print("✅ All workers stopped")
+
+
+if __name__ == "__main__":
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py requires a POSIX platform; use run.py for development")
+    print("🚀 Starting Media Ad Generator API (production)")
+    print(f"📍 Listening on {settings.HOST}:{settings.PORT} with {settings.WORKERS} workers "
+          f"({'SO_REUSEPORT' if settings.REUSE_PORT else 'shared socket'})")
+    print("=" * 50)
+    Supervisor().run()